@@ -0,0 +1,160 @@
+# built-in
+import time, asyncio, random
+# submodule
+from scraping_tools.snap_timer import SnapTimer, SnapScheduler
+from scraping_tools.timing_stats import TimingRegistry
+
+
+class AsyncSnapTimer(SnapTimer):
+    """
+        AsyncSnapTimer(snap_interval, start=None, name=None, **kwargs)
+
+        SnapTimer for coroutines, print the same summary and `await asyncio.sleep` instead of blocking the thread.
+        協程版 SnapTimer, 等待期間不佔用執行緒.
+
+        How to use:
+            @DecoratorUtils.async_snap_interval(minutes=5)
+            async def scrape(snap_interval):
+                ...
+                await AsyncSnapTimer(snap_interval, name='my_scraper')
+    """
+
+    def __init__(self, snap_interval, start=None, name=None, **kwargs):
+        self.snap_interval = snap_interval
+        self.start = start
+        self.extra_info_dict = kwargs
+        self.name = name
+
+    async def _async_sleep(self, seconds=None):
+        seconds = self.snap_interval if seconds is None else seconds
+        self._print_sleep(seconds)
+        await asyncio.sleep(seconds)
+
+    async def _async_run(self):
+        self._print_divider()
+        self._extra_info()
+        self._consume()
+        await self._async_sleep()
+
+    def __await__(self):
+        return self._async_run().__await__()
+
+
+class AsyncSnapScheduler(SnapScheduler):
+    """
+        AsyncSnapScheduler(snap_interval, name=None, overrun='skip', jitter=0, stop_event=None, semaphore=None, **kwargs)
+
+        SnapScheduler for coroutines, `await scheduler.run(job)` calls `await job()` on a fixed cadence.
+        :stop_event: asyncio.Event, setting it wakes the wait up and stops the loop.
+        :semaphore: asyncio.Semaphore shared with other schedulers, held only while the job runs.
+    """
+
+    def __init__(self, snap_interval, name=None, overrun='skip', jitter=0, stop_event=None, semaphore=None,
+            **kwargs):
+        super().__init__(snap_interval=snap_interval, name=name, overrun=overrun, jitter=jitter, **kwargs)
+        self.stop_event = stop_event
+        self.semaphore = semaphore
+
+    def stop(self, *args):
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    async def _async_wait(self, seconds):
+        """
+            Return True when the stop event is set before `seconds`.
+        """
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout=max(seconds, 0))
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _call(self, job, *args, **kwargs):
+        if self.semaphore is None:
+            return await job(*args, **kwargs)
+        async with self.semaphore:
+            return await job(*args, **kwargs)
+
+    async def run(self, job, *args, max_runs=None, **kwargs):
+        """
+            Await `job(*args, **kwargs)` on every tick until stopped or `max_runs` runs.
+        """
+        if self.stop_event is None:
+            self.stop_event = asyncio.Event()
+        deadline = time.monotonic()
+        while not self.stop_event.is_set():
+            self.start = time.time()
+            TimingRegistry.mark()
+            await self._call(job, *args, **kwargs)
+            self.runs += 1
+            self._print_divider()
+            self._extra_info()
+            self._consume()
+            if max_runs is not None and self.runs >= max_runs:
+                break
+            now = time.monotonic()
+            deadline = self._get_next_deadline(deadline=deadline, now=now)
+            delay = deadline - now
+            if self.jitter:
+                delay += self._random.uniform(0, self.jitter)
+            self._print_sleep(delay)
+            if await self._async_wait(delay):
+                break
+        return self.runs
+
+
+class AsyncSnapGroup:
+    """
+        AsyncSnapGroup(max_concurrency=10, jitter=0)
+
+        Many periodic coroutines in one event loop, each with its own interval and summary,
+        at most `max_concurrency` jobs run at once.
+        單一事件迴圈排程大量週期任務, 並限制同時執行數量.
+
+        :jitter: default jitter of the schedulers, the first run of each job is also delayed by up to `jitter`.
+
+        How to use:
+            group = AsyncSnapGroup(max_concurrency=20, jitter=5)
+            for url in urls:
+                group.add(fetch, url, snap_interval=60, name=url)
+            await group.run()
+            group.stop()    -> from a job or a signal handler of the loop
+    """
+
+    def __init__(self, max_concurrency=10, jitter=0):
+        self.max_concurrency = max_concurrency
+        self.jitter = jitter
+        self.schedulers = list()
+        self._jobs = list()
+        self._stop_event = None
+        self._random = random.Random()
+
+    def add(self, job, *args, snap_interval, name=None, max_runs=None, **scheduler_kwargs):
+        """
+            Schedule `await job(*args)` every `snap_interval` seconds, return its AsyncSnapScheduler.
+        """
+        scheduler_kwargs.setdefault('jitter', self.jitter)
+        scheduler = AsyncSnapScheduler(snap_interval=snap_interval, name=name, **scheduler_kwargs)
+        self.schedulers.append(scheduler)
+        self._jobs.append((scheduler, job, args, max_runs))
+        return scheduler
+
+    async def _run_one(self, scheduler, job, args, max_runs):
+        if scheduler.jitter:
+            await scheduler._async_wait(self._random.uniform(0, scheduler.jitter))
+        return await scheduler.run(job, *args, max_runs=max_runs)
+
+    async def run(self):
+        """
+            Run every scheduler until all of them stop, return their run counts.
+        """
+        self._stop_event = asyncio.Event()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        for scheduler in self.schedulers:
+            scheduler.stop_event = self._stop_event
+            scheduler.semaphore = semaphore
+        return await asyncio.gather(*(self._run_one(*job) for job in self._jobs))
+
+    def stop(self):
+        if self._stop_event is not None:
+            self._stop_event.set()
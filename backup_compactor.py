@@ -0,0 +1,143 @@
+# built-in
+import os
+from datetime import datetime
+# submodule
+from scraping_tools.backup_formats import BackupFormats, get_file_digest
+from scraping_tools.backup_manifest import BackupManifest
+
+
+class BackupCompactor:
+    """
+        BackupCompactor(path, models_name, now=None, until=None, format_=None)
+
+        Merge, for every table, its latest full generation and the incremental
+        generations after it into a new full generation `backup_<now>`,
+        rows are matched on the primary key recorded in the manifest, the newest copy wins.
+        合併完整備份與其後的增量備份, 產生新的完整備份世代.
+
+        :path: same as BackupDatabase.path.
+        :now: datetime of the new generation, default to datetime.now().
+        :until: name of the newest generation when it was planned, the compaction is refused
+            if another generation was made since, it would be left out of every chain.
+        :format_: output format, default to the format of the newest generation,
+            only CSV formats can be read back ('csv', 'csv.gz', 'csv.zst').
+
+        How to use:
+            BackupCompactor(path='static/backup/', models_name='models')
+    """
+
+    def __init__(self, path, models_name, now=None, until=None, format_=None):
+        self.path = path
+        self.models_name = models_name
+        self.now = now or datetime.now()
+        self.until = until
+        self.manifest = BackupManifest(path=path, models_name=models_name)
+        self.format_class = BackupFormats.get(format_) if format_ else None
+
+        self._run()
+
+    @staticmethod
+    def _get_readable_format(name):
+        format_class = BackupFormats.get(name)
+        if not hasattr(format_class, 'read_rows'):
+            raise Exception(f'[{"ERROR":10}]| Backup format "{name}" can not be compacted')
+        return format_class
+
+    def _get_file_pathname(self, generation, table_name, format_class):
+        return os.path.join(self.path, generation['name'], self.models_name, f'{table_name}{format_class.extension}')
+
+    def _iter_generation(self, generation, table_name, fieldnames):
+        """
+            Yield the rows of a table in one generation reordered like `fieldnames`,
+            columns missing from that generation are filled with 'NULL'.
+        """
+        format_class = self._get_readable_format(name=generation['format'])
+        file_pathname = self._get_file_pathname(generation=generation, table_name=table_name, format_class=format_class)
+        if not os.path.exists(file_pathname):
+            return
+        rows = format_class.read_rows(pathname=file_pathname)
+        header = next(rows, None)
+        if header is None:
+            return
+        if header == fieldnames:
+            yield from rows
+            return
+        indexes = [header.index(name) if name in header else None for name in fieldnames]
+        for row in rows:
+            yield [row[index] if index is not None else 'NULL' for index in indexes]
+
+    def _compact_table(self, table_name, chain, backup_path, format_class):
+        """
+            Return (rows, manifest file record or None when the table is empty).
+        """
+        table = self.manifest.get_table(table_name=table_name)
+        fieldnames = table['fieldnames']
+        key_indexes = [fieldnames.index(name) for name in table['primary_key']]
+        changes = dict()
+        for generation in chain[1:]:
+            for row in self._iter_generation(generation=generation, table_name=table_name, fieldnames=fieldnames):
+                changes[tuple(row[index] for index in key_indexes)] = row
+
+        file_pathname = os.path.join(backup_path, f'{table_name}{format_class.extension}')
+        temp_pathname = f'{file_pathname}.tmp'
+        count = 0
+        writer = format_class(pathname=temp_pathname, fieldnames=fieldnames)
+        completed = False
+        try:
+            batch = list()
+            for row in self._iter_generation(generation=chain[0], table_name=table_name, fieldnames=fieldnames):
+                batch.append(changes.pop(tuple(row[index] for index in key_indexes), row))
+                if len(batch) >= format_class.batch_size:
+                    writer.write_rows(batch)
+                    count += len(batch)
+                    batch = list()
+            batch.extend(changes.values())
+            writer.write_rows(batch)
+            count += len(batch)
+            completed = True
+        finally:
+            writer.close()
+            if not completed and os.path.exists(temp_pathname):
+                os.remove(temp_pathname)
+        if not count:
+            os.remove(temp_pathname)
+            return count, None
+        os.replace(temp_pathname, file_pathname)
+        record = {
+            'sha256': writer.hexdigest() or get_file_digest(pathname=file_pathname),
+            'bytes': os.path.getsize(file_pathname),
+            'rows': count,
+        }
+        return count, record
+
+    def _run(self):
+        name = self.manifest.get_generation_name(datetime_=self.now)
+        if self.manifest.get_generation(name=name) is not None:
+            raise Exception(f'[{"ERROR":10}]| Generation already exists: {name}')
+        generations = [_ for _ in self.manifest.generations if self.until is None or _['name'] <= self.until]
+        if not generations:
+            raise Exception(f'[{"ERROR":10}]| No generation to compact in {self.path}')
+        # the compacted generation becomes the start of every chain, nothing may sort after it unmerged
+        if len(generations) < len(self.manifest.generations):
+            raise Exception(
+                f'[{"ERROR":10}]| `until` must be the newest generation, '
+                f'{self.manifest.generations[-1]["name"]} is after {self.until}')
+        if name < generations[-1]['name']:
+            raise Exception(f'[{"ERROR":10}]| Generation {name} would sort before {generations[-1]["name"]}')
+        format_class = self.format_class or self._get_readable_format(name=generations[-1]['format'])
+        backup_path = os.path.join(self.path, name, self.models_name)
+        os.makedirs(backup_path, exist_ok=True)
+        tables = dict()
+        files = dict()
+        for table_name in sorted(self.manifest.data['tables']):
+            chain = self.manifest.get_chain(table_name=table_name, until=self.until)
+            if not chain:
+                continue
+            count, record = self._compact_table(
+                table_name=table_name, chain=chain, backup_path=backup_path, format_class=format_class)
+            tables[table_name] = 'full'
+            if record is not None:
+                files[table_name] = record
+            print(f'[COMPACT   ]| {table_name[:20]:21}| {len(chain):5} Generations {count:,} Qty.')
+        self.manifest.add_generation(name=name, format_=format_class.name, tables=tables, files=files)
+        self.manifest.save()
@@ -1,87 +1,103 @@
 # built-in
-import os, csv, inspect, time, subprocess
+import os, time, shutil, subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from datetime import datetime, timedelta
 # 3rd-party
-from flask_sqlalchemy import DefaultMeta
+from sqlalchemy import func, inspect as sa_inspect
+from sqlalchemy.orm import Session
 # submodule
 from scraping_tools.super_print import SuperPrint
-from scraping_tools.progress_bar import ProgressBar
+from scraping_tools.backup_formats import BackupFormats, HashingFile, get_file_digest
+from scraping_tools.backup_index import BackupIndexWriter
+from scraping_tools.backup_manifest import BackupManifest
+from scraping_tools.keyset_reader import KeysetReader
+from scraping_tools.model_registry import ModelRegistry
+from scraping_tools.progress_bar import LiveProgressBar, MultiProgressBar
 from scraping_tools.snap_timer import SnapTimer
-from scraping_tools.utils import Utils
 
 
 class BackupDatabase:
 
-    def __init__(self, models, models_name, now, path):
+    def __init__(self, models, models_name, now, path, projected=False, workers=1, range_rows=200000,
+            format_='csv', incremental=False, watermark_column='updated_at', dedup=False,
+            index=False):
+        """
+            :projected: select only the data columns as plain tuples through
+                SQLAlchemy Core instead of loading ORM objects, same CSV output.
+            :workers: export several tables at once when greater than 1,
+                each worker opens its own session from the engine pool.
+            :range_rows: in parallel mode, tables larger than this are split into
+                primary key ranges, at most `workers * range_rows` rows are held at once.
+            :format_: output format, one of BackupFormats.names(),
+                'csv' (default), 'csv.gz', 'csv.zst', 'ndjson', 'parquet'.
+            :incremental: only export rows new or changed since the high water mark
+                recorded in `<path>/<models_name>.manifest.json`, tables without a mark are exported in full.
+                Deleted rows are not tracked, merge generations back with BackupCompactor.
+            :watermark_column: column holding the update time, tables without it
+                fall back to a single integer primary key (new rows only).
+            :dedup: the sha256 of every file is recorded in the manifest, when it matches the same table
+                of the previous generation the new file is replaced by a hard link to the previous one.
+                File systems without hard links keep the copy.
+            :index: write a primary key index `<table_name>.csv.idx` next to every plain CSV,
+                read single rows or key ranges back with BackupIndexReader.
+        """
         self.models = models
         self.models_name = models_name
         self.now = now
         self.path = path
+        self.projected = projected
+        self.workers = workers
+        self.range_rows = range_rows
+        self.format_class = BackupFormats.get(format_)
+        self.incremental = incremental
+        self.watermark_column = watermark_column
+        self.dedup = dedup
+        self.index = index
+        if index and not self.format_class.indexable:
+            raise Exception(f'[{"ERROR":10}]| Backup format "{self.format_class.name}" can not be indexed, use "csv"')
+        self.manifest = BackupManifest(path=path, models_name=models_name)
 
         self._run()
 
     @staticmethod
     def get_column_names(table):
-        table_obj = table.__dict__
-        data_fields = list()
-        for key, value in table_obj.items():
-            if key.startswith('_'):
-                continue
-            value_dict = value.__dict__
-            comparator = value_dict['comparator']
-            comparator_dict = comparator.__dict__
-            data_type = comparator_dict.get('type', None)
-            python_data_type = getattr(data_type, 'python_type', None)
-            if python_data_type:
-                data_fields.append(key)
-        return data_fields
-
-    @classmethod
-    def _slice_query(cls, table, table_name_camel, slice_length=2000):
+        return list(ModelRegistry.get(model=table).columns)
+
+    @staticmethod
+    def get_column_types(table):
+        """
+            Return {column_name: SQLAlchemy type} for every data column.
+        """
+        return dict(ModelRegistry.get(model=table).column_types)
+
+    @staticmethod
+    def _get_reader(table, column_names, projected=False, session=None, after=None, until=None, where=None,
+            slice_length=4000):
         '''
-            切片迭代資料庫
+            切片迭代資料庫 (依主鍵分頁)
+            :projected: 以 Core 查詢指定欄位回傳 tuple
+            :where: 額外篩選條件, 增量備份使用
         '''
-        count = 0
-        data_list = list()
-        while True:
-            start = slice_length * count
-            _slice = table.query.slice(
-                start,
-                slice_length + start
-            ).all()
-            if not _slice:
-                print(f'[SLICE     ]| {table_name_camel[:20]:21}| {(count + 1):11} Times '
-                f'{(slice_length * count):,} Qty.')
-                break
-            data_list.extend([data for data in _slice])
-            if len(_slice) < slice_length:
-                print(f'[SLICE     ]| {table_name_camel[:20]:21}| {(count + 1):11} Times '
-                    f'{(slice_length * count + len(_slice)):,} Qty.')
-                break
-            count += 1
-            print(f'[SLICE     ]| {table_name_camel[:20]:21}| {(count + 1):11} Times '
-                f'{(slice_length * count):,} Qty.', end='\r', flush=True)
-        return data_list
-
-    @classmethod
-    def _convert_table_to_list(cls, table_name_camel, table):
-        column_names = cls.get_column_names(table=table)
-        data_list = cls._slice_query(table=table, table_name_camel=table_name_camel, slice_length=4000)
-        amount = len(data_list)
-        count = 0
-        results = list()
-        for data in data_list:
-            results.append({name: getattr(data, name) for name in column_names})
-            count += 1
-            ProgressBar(count=count, amount=amount, info='<< BACKUP', desc=f'{table_name_camel}')
-        return results
+        columns = column_names if projected else None
+        return KeysetReader(
+            table=table, slice_length=slice_length, session=session, columns=columns,
+            after=after, until=until, where=where)
+
+    @staticmethod
+    def _iter_rows(reader, column_names):
+        """
+            Yield every row as a tuple ordered like `column_names`.
+        """
+        if reader.columns is not None:
+            for page in reader.iter_pages():
+                yield from page
+            return
+        for page in reader.iter_pages():
+            for data in page:
+                yield tuple(getattr(data, name) for name in column_names)
 
     def _get_tables(self):
-        tables = dict()
-        for name, table in inspect.getmembers(self.models):
-            if isinstance(table, DefaultMeta):
-                tables.update({table.__name__: table})
-        return tables
+        return ModelRegistry.get_models(models=self.models)
 
     @staticmethod
     def _get_format_datetime(datetime_, format_='backup_%Y_%m_%dT%H_%M'):
@@ -95,27 +111,276 @@ class BackupDatabase:
     def _make_directories(path):
         os.makedirs(path, exist_ok=True)
 
+    def _write_table(self, file_pathname, fieldnames, column_types, rows, write_header=True, desc=None, amount=0,
+            counter=None, key_indexes=None, key_types=None):
+        """
+            Stream rows into `<file_pathname>.tmp` in batches with the backup format
+            and rename it to `file_pathname` once complete, return (rows, sha256 of the file).
+            The temporary files are removed when writing fails.
+            :desc: draw a LiveProgressBar when given.
+            :counter: ProgressCounter of a MultiProgressBar, updated per batch.
+            :key_indexes: positions of the primary key in a row, write `<file_pathname>.idx` when given.
+            :key_types: BackupIndexWriter key types of the primary key.
+        """
+        batch_size = self.format_class.batch_size
+        temp_pathname = f'{file_pathname}.tmp'
+        count = 0
+        bar = LiveProgressBar(amount=amount, info='EXPORT >>', desc=desc) if desc is not None else None
+        writer = self.format_class(
+            pathname=temp_pathname, fieldnames=fieldnames, column_types=column_types, write_header=write_header)
+        index_writer = None
+        completed = False
+        try:
+            if key_indexes is not None:
+                index_writer = BackupIndexWriter(
+                    pathname=BackupIndexWriter.get_pathname(file_pathname=temp_pathname), key_types=key_types)
+            batch = list()
+            for row in rows:
+                batch.append(row)
+                if len(batch) < batch_size:
+                    continue
+                self._write_batch(writer=writer, index_writer=index_writer, batch=batch, key_indexes=key_indexes)
+                count += len(batch)
+                batch = list()
+                if bar is not None:
+                    bar.update(batch_size)
+                if counter is not None:
+                    counter.update(batch_size)
+            if batch:
+                self._write_batch(writer=writer, index_writer=index_writer, batch=batch, key_indexes=key_indexes)
+                count += len(batch)
+                if bar is not None:
+                    bar.update(len(batch))
+                if counter is not None:
+                    counter.update(len(batch))
+            if bar is not None:
+                bar.amount = count
+            completed = True
+        finally:
+            writer.close()
+            if index_writer is not None:
+                index_writer.close()
+            if bar is not None:
+                bar.close()
+            if not completed:
+                self._remove_files(temp_pathname, BackupIndexWriter.get_pathname(file_pathname=temp_pathname))
+        os.replace(temp_pathname, file_pathname)
+        if index_writer is not None:
+            os.replace(index_writer.pathname, BackupIndexWriter.get_pathname(file_pathname=file_pathname))
+        return count, writer.hexdigest() or get_file_digest(pathname=file_pathname)
+
+    @staticmethod
+    def _remove_files(*pathnames):
+        for pathname in pathnames:
+            try:
+                os.remove(pathname)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _write_batch(writer, index_writer, batch, key_indexes):
+        if index_writer is None:
+            writer.write_rows(batch)
+            return
+        offsets = writer.write_rows_with_offsets(batch)
+        index_writer.add(keys=[tuple(row[index] for index in key_indexes) for row in batch], offsets=offsets)
+
+    def _get_file_pathname(self, backup_path, table_name):
+        return os.path.join(backup_path, f'{table_name}{self.format_class.extension}')
+
+    def _export(self, table_name, backup_path, rows, fieldnames, column_types, amount=0, key_indexes=None,
+            key_types=None):
+        file_pathname = self._get_file_pathname(backup_path=backup_path, table_name=table_name)
+        return self._write_table(
+            file_pathname=file_pathname, fieldnames=fieldnames, column_types=column_types,
+            rows=rows, desc=table_name, amount=amount, key_indexes=key_indexes, key_types=key_types)
+
+    def _export_range(self, table, column_names, column_types, engine, file_pathname, after, until, where,
+            write_header, counter=None, key_indexes=None, key_types=None):
+        """
+            Worker: export one primary key range of a table with its own session.
+        """
+        session = Session(bind=engine)
+        try:
+            reader = self._get_reader(
+                table=table, column_names=column_names, projected=self.projected,
+                session=session, after=after, until=until, where=where)
+            return self._write_table(
+                file_pathname=file_pathname, fieldnames=column_names, column_types=column_types,
+                rows=self._iter_rows(reader=reader, column_names=column_names), write_header=write_header,
+                counter=counter, key_indexes=key_indexes, key_types=key_types)
+        finally:
+            session.close()
+
     @staticmethod
-    def _export(table_name, backup_path, table_list):
-        fieldnames = table_list[0].keys()
-        delimiter = ','
-        quotechar = '|'
-        quoting = csv.QUOTE_ALL
-        file_pathname = os.path.join(backup_path, f'{table_name}.csv')
-        with open(file_pathname, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(
-                f=csvfile, fieldnames=fieldnames,
-                delimiter=delimiter, quotechar=quotechar, quoting=quoting)
-            writer.writeheader()
-            amount = len(table_list)
-            count = 0
-            for data in table_list:
-                for key, value in data.items():
-                    if value is None:
-                        data.update({key: 'NULL'})
-                writer.writerow(data)
-                count += 1
-                ProgressBar(count=count, amount=amount, info='EXPORT >>', desc=f'{table_name}')
+    def _merge_parts(file_pathname, part_pathnames, index=False):
+        """
+            Concatenate range parts in key order, only the first part has the header,
+            gzip members and zstd frames stay valid once concatenated.
+            The part indexes are merged with their offsets moved by the start of each part.
+            Return the sha256 of the merged file.
+        """
+        temp_pathname = f'{file_pathname}.tmp'
+        raw = HashingFile(pathname=temp_pathname)
+        index_parts = list()
+        with raw:
+            for part_pathname in part_pathnames:
+                index_parts.append((BackupIndexWriter.get_pathname(file_pathname=part_pathname), raw.size))
+                with open(part_pathname, 'rb') as part:
+                    shutil.copyfileobj(part, raw)
+                os.remove(part_pathname)
+        os.replace(temp_pathname, file_pathname)
+        if index:
+            BackupIndexWriter.merge(
+                pathname=BackupIndexWriter.get_pathname(file_pathname=file_pathname), parts=index_parts)
+        return raw.hexdigest()
+
+    @staticmethod
+    def _link(source, target):
+        """
+            Atomically replace `target` by a hard link to `source`, False when hard links are not supported.
+        """
+        link_pathname = f'{target}.link'
+        try:
+            os.link(source, link_pathname)
+        except OSError:
+            return False
+        os.replace(link_pathname, target)
+        return True
+
+    def _link_previous(self, plan):
+        """
+            Replace a new file by a hard link to the same table of the previous generation
+            when both have the same size and sha256, return the name of that generation or None.
+        """
+        found = self.manifest.get_previous_file(
+            table_name=plan['table_name'], before=self._get_format_datetime(datetime_=self.now),
+            format_=self.format_class.name)
+        if found is None:
+            return None
+        generation, record = found
+        if record.get('sha256') != plan['sha256'] or record.get('bytes') != plan['bytes']:
+            return None
+        previous_pathname = os.path.join(
+            self.path, generation['name'], self.models_name, os.path.basename(plan['file_pathname']))
+        if not os.path.isfile(previous_pathname) or os.path.getsize(previous_pathname) != plan['bytes']:
+            return None
+        if not self._link(source=previous_pathname, target=plan['file_pathname']):
+            # no hard links on this file system, keep the copy
+            return None
+        previous_index = BackupIndexWriter.get_pathname(file_pathname=previous_pathname)
+        index_pathname = BackupIndexWriter.get_pathname(file_pathname=plan['file_pathname'])
+        if self.index and os.path.isfile(previous_index):
+            self._link(source=previous_index, target=index_pathname)
+        return generation['name']
+
+    def _finish_file(self, plan, quantity, digest):
+        plan['quantity'] = quantity
+        plan['sha256'] = digest
+        plan['bytes'] = os.path.getsize(plan['file_pathname'])
+        plan['linked'] = self._link_previous(plan=plan) if self.dedup else None
+
+    @staticmethod
+    def _get_export_message(plan):
+        """
+            One summary line per exported table, printed even when no progress bar is drawn (cron).
+        """
+        parts = len(plan['key_ranges'])
+        message = f'[EXPORT >> ]| {plan["table_name"][:20]:21}| {parts:5} Parts {plan["quantity"]:,} Qty.'
+        if plan['linked']:
+            message = f'{message} Linked to {plan["linked"]}'
+        return message
+
+    def _get_watermark(self, table, meta):
+        """
+            Return (column, mode, where, high_water_mark) of a table,
+            mode is 'incremental' when a previous high water mark exists.
+            The mark is read before exporting, rows changed meanwhile come again next time.
+            Only incremental backups read it, a full backup keeps the mark recorded in the manifest.
+        """
+        primary_key = meta.primary_key
+        if self.watermark_column in meta.column_types:
+            column = self.watermark_column
+        elif len(primary_key) == 1 and meta.python_types.get(primary_key[0]) is int:
+            column = primary_key[0]
+        else:
+            return None, 'full', list(), None
+        if not self.incremental:
+            return column, 'full', list(), None
+        attribute = getattr(table, column)
+        high_water_mark = table.query.session.query(func.max(attribute)).scalar()
+        last = self.manifest.get_high_water_mark(table_name=meta.file_name, column=column)
+        if last is None:
+            return column, 'full', list(), high_water_mark
+        # timestamps may repeat, keep rows equal to the mark, compaction drops the duplicates
+        where = [attribute > last] if column in primary_key else [attribute >= last]
+        return column, 'incremental', where, high_water_mark
+
+    def _plan_table(self, table, backup_path, split=False):
+        """
+            Split a table into export tasks, one per primary key range.
+        """
+        meta = ModelRegistry.get(model=table)
+        table_name = meta.file_name
+        column_types = meta.column_types
+        primary_key = meta.primary_key
+        column_names = list(column_types)
+        watermark_column, mode, where, high_water_mark = self._get_watermark(table=table, meta=meta)
+        reader = KeysetReader(table=table, where=where)
+        amount = reader.count()
+        if split and amount > self.range_rows and self.format_class.splittable:
+            key_ranges = reader.get_key_ranges(range_rows=self.range_rows)
+        else:
+            key_ranges = [(None, None)]
+        file_pathname = self._get_file_pathname(backup_path=backup_path, table_name=table_name)
+        if len(key_ranges) == 1:
+            part_pathnames = [file_pathname]
+        else:
+            part_pathnames = [f'{file_pathname}.part{index:04}' for index in range(len(key_ranges))]
+        return {
+            'table_name': table_name,
+            'table': table,
+            'amount': amount,
+            'file_pathname': file_pathname,
+            'column_names': column_names,
+            'column_types': list(column_types.values()),
+            'primary_key': primary_key,
+            'key_indexes': [column_names.index(name) for name in primary_key] if self.index else None,
+            'key_types': BackupIndexWriter.get_key_types(
+                python_types=[meta.python_types.get(name) for name in primary_key]),
+            'mode': mode,
+            'where': where,
+            'watermark_column': watermark_column,
+            'high_water_mark': high_water_mark,
+            'engine': table.query.session.get_bind(mapper=sa_inspect(table)),
+            'key_ranges': key_ranges,
+            'part_pathnames': part_pathnames,
+        }
+
+    def _get_plans(self, backup_path, split=False):
+        plans = list()
+        for table in self._get_tables().values():
+            plans.append(self._plan_table(table=table, backup_path=backup_path, split=split))
+        return plans
+
+    def _update_manifest(self, plans):
+        tables = dict()
+        files = dict()
+        for plan in plans:
+            tables[plan['table_name']] = plan['mode']
+            if plan.get('sha256'):
+                files[plan['table_name']] = {
+                    'sha256': plan['sha256'], 'bytes': plan['bytes'], 'rows': plan['quantity']}
+                if plan['linked']:
+                    files[plan['table_name']]['linked'] = plan['linked']
+            self.manifest.set_table(
+                table_name=plan['table_name'], column=plan['watermark_column'],
+                high_water_mark=plan['high_water_mark'], primary_key=plan['primary_key'],
+                fieldnames=plan['column_names'])
+        self.manifest.add_generation(
+            name=self._get_format_datetime(datetime_=self.now), format_=self.format_class.name, tables=tables,
+            files=files)
+        self.manifest.save()
 
     @staticmethod
     def _is_empty(path):
@@ -123,21 +388,102 @@ class BackupDatabase:
             return True
         return False
 
+    def _run_sequential(self, backup_path):
+        plans = self._get_plans(backup_path=backup_path)
+        for plan in plans:
+            if not plan['amount']:
+                continue
+            reader = self._get_reader(
+                table=plan['table'], column_names=plan['column_names'], projected=self.projected, where=plan['where'])
+            quantity, digest = self._export(
+                table_name=plan['table_name'], backup_path=backup_path,
+                rows=self._iter_rows(reader=reader, column_names=plan['column_names']),
+                fieldnames=plan['column_names'], column_types=plan['column_types'], amount=plan['amount'],
+                key_indexes=plan['key_indexes'], key_types=plan['key_types'])
+            self._finish_file(plan=plan, quantity=quantity, digest=digest)
+            print(self._get_export_message(plan=plan))
+        return plans
+
+    def _abort_parallel(self, futures):
+        """
+            Cancel the queued ranges, wait for the running ones and remove
+            the parts of every table not finished yet.
+        """
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        for plan in {id(plan): plan for plan in futures.values()}.values():
+            if plan.get('finished'):
+                continue
+            for part_pathname in plan['part_pathnames']:
+                index_pathname = BackupIndexWriter.get_pathname(file_pathname=part_pathname)
+                self._remove_files(
+                    part_pathname, f'{part_pathname}.tmp', index_pathname,
+                    BackupIndexWriter.get_pathname(file_pathname=f'{part_pathname}.tmp'))
+            if len(plan['part_pathnames']) > 1:
+                self._remove_files(
+                    f'{plan["file_pathname"]}.tmp', BackupIndexWriter.get_pathname(file_pathname=plan['file_pathname']),
+                    f'{BackupIndexWriter.get_pathname(file_pathname=plan["file_pathname"])}.tmp')
+
+    def _run_parallel(self, backup_path):
+        """
+            Export tables (and key ranges of large tables) on a worker pool,
+            workers only count rows, a MultiProgressBar draws one bar per table
+            and prints one line per finished table.
+            When a range fails, the other ranges are cancelled and the unfinished tables removed.
+        """
+        plans = self._get_plans(backup_path=backup_path, split=True)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor, MultiProgressBar() as progress:
+            futures = dict()
+            for plan in plans:
+                if not plan['amount']:
+                    continue
+                plan['pending'] = len(plan['key_ranges'])
+                plan['quantity'] = 0
+                plan['digest'] = None
+                counter = progress.add(name=plan['table_name'], amount=plan['amount'], info='EXPORT >>')
+                for index, ((after, until), part_pathname) in enumerate(
+                        zip(plan['key_ranges'], plan['part_pathnames'])):
+                    future = executor.submit(
+                        self._export_range, table=plan['table'], column_names=plan['column_names'],
+                        column_types=plan['column_types'], engine=plan['engine'], file_pathname=part_pathname,
+                        after=after, until=until, where=plan['where'], write_header=index == 0, counter=counter,
+                        key_indexes=plan['key_indexes'], key_types=plan['key_types'])
+                    futures[future] = plan
+            try:
+                for future in as_completed(futures):
+                    plan = futures[future]
+                    quantity, plan['digest'] = future.result()
+                    plan['quantity'] += quantity
+                    plan['pending'] -= 1
+                    if plan['pending']:
+                        continue
+                    if len(plan['part_pathnames']) > 1:
+                        plan['digest'] = self._merge_parts(
+                            file_pathname=plan['file_pathname'], part_pathnames=plan['part_pathnames'],
+                            index=self.index)
+                    self._finish_file(plan=plan, quantity=plan['quantity'], digest=plan['digest'])
+                    progress.finish(
+                        name=plan['table_name'], amount=plan['quantity'], message=self._get_export_message(plan=plan))
+                    plan['finished'] = True
+            except BaseException:
+                self._abort_parallel(futures=futures)
+                raise
+        return plans
+
     def _run(self):
         """
             備份至 'static/backup/') 之下,
             資料夾格式 'backup_%Y_%m_%dT%H_%M_%S' -> 'backup_2020_02_18T17_28_54'
         """
-        tables = self._get_tables()
         backup_path = self._get_backup_path()
         self._make_directories(path=backup_path)
-        for table_name_camel, table in tables.items():
-            table_list = self._convert_table_to_list(table_name_camel=table_name_camel, table=table)
-            if not table_list:
-                continue
-            table_name = Utils.camel_to_underscore(letters=table_name_camel)
-            self._export(table_name=table_name, backup_path=backup_path, table_list=table_list)
+        if self.workers > 1:
+            plans = self._run_parallel(backup_path=backup_path)
+        else:
+            plans = self._run_sequential(backup_path=backup_path)
         if os.path.exists(path=backup_path) and self._is_empty(path=backup_path):
             os.removedirs(name=backup_path)
             print(f'Removed empty backup directory {backup_path}')
-
+            return
+        self._update_manifest(plans=plans)
@@ -0,0 +1,359 @@
+# built-in
+import io, csv, json, gzip, hashlib, datetime, decimal
+
+
+class HashingFile(io.RawIOBase):
+    """
+        HashingFile(pathname, algorithm='sha256')
+
+        Binary file opened for writing that feeds every written byte to a hash,
+        the digest of the file is known once it is closed without reading it again.
+        寫入時同步計算檔案雜湊.
+    """
+
+    def __init__(self, pathname, algorithm='sha256'):
+        self.pathname = pathname
+        self.size = 0
+        self._file = open(pathname, 'wb')
+        self._hash = hashlib.new(algorithm)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        written = self._file.write(data)
+        self._hash.update(data)
+        self.size += written
+        return written
+
+    def flush(self):
+        if not self.closed:
+            self._file.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        self._file.close()
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+class _LineCollector:
+    """
+        Target of csv.writer keeping the written lines, csv.writer writes one line per row.
+    """
+
+    def __init__(self):
+        self.lines = list()
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def pop(self):
+        lines, self.lines = self.lines, list()
+        return lines
+
+
+def get_file_digest(pathname, algorithm='sha256', chunk_size=1 << 20):
+    """
+        Hash an existing file, for formats written by a third-party library.
+    """
+    hash_ = hashlib.new(algorithm)
+    with open(pathname, 'rb') as fr:
+        for chunk in iter(lambda: fr.read(chunk_size), b''):
+            hash_.update(chunk)
+    return hash_.hexdigest()
+
+
+class CsvFormat:
+    """
+        CsvFormat(pathname, fieldnames, column_types=None, write_header=True)
+
+        Plain CSV in UTF-8, every field quoted by '|' and None written as 'NULL'.
+        BackupDatabase 預設輸出格式.
+
+        :column_types: SQLAlchemy column types in the order of `fieldnames`,
+            only used by typed formats.
+        :write_header: parts of a split table only write the header in the first part,
+            `splittable` formats can then be concatenated byte by byte.
+    """
+    name = 'csv'
+    extension = '.csv'
+    splittable = True
+    indexable = True
+    batch_size = 1000
+    _NULL_SUBSTITUTES = {None: 'NULL'}
+
+    def __init__(self, pathname, fieldnames, column_types=None, write_header=True):
+        self.pathname = pathname
+        self.fieldnames = list(fieldnames)
+        self.column_types = column_types
+        self.write_header = write_header
+        self._line_writer = None
+
+        self._open()
+        self.writer = csv.writer(self.file, delimiter=',', quotechar='|', quoting=csv.QUOTE_ALL)
+        if self.write_header:
+            self.writer.writerow(self.fieldnames)
+
+    def _open(self):
+        self._raw = HashingFile(pathname=self.pathname)
+        self.file = io.TextIOWrapper(self._raw, encoding='utf-8', newline='')
+
+    @classmethod
+    def _substitute_null(cls, row):
+        """
+            Replace None with 'NULL', rows without None are returned untouched,
+            the mapping runs in C through dict.get(value, value).
+        """
+        if None not in row:
+            return row
+        try:
+            return tuple(map(cls._NULL_SUBSTITUTES.get, row, row))
+        except TypeError:
+            # unhashable values, e.g. JSON columns
+            return tuple('NULL' if value is None else value for value in row)
+
+    def write_rows(self, rows):
+        self.writer.writerows(map(self._substitute_null, rows))
+
+    def write_rows_with_offsets(self, rows):
+        """
+            Write rows like `write_rows` and return the byte offset of every row in the file,
+            the lines are encoded here and written straight to the raw file so the offsets stay exact.
+        """
+        if self._line_writer is None:
+            self._lines = _LineCollector()
+            self._line_writer = csv.writer(self._lines, delimiter=',', quotechar='|', quoting=csv.QUOTE_ALL)
+        self._line_writer.writerows(map(self._substitute_null, rows))
+        lines = self._lines.pop()
+        self.file.flush()
+        offset = self._raw.size
+        offsets = list()
+        chunks = list()
+        encoding = self.file.encoding
+        for line in lines:
+            chunk = line.encode(encoding)
+            offsets.append(offset)
+            offset += len(chunk)
+            chunks.append(chunk)
+        self._raw.write(b''.join(chunks))
+        return offsets
+
+    def close(self):
+        self.file.close()
+
+    def hexdigest(self):
+        """
+            sha256 of the bytes written to disk, complete once closed.
+        """
+        return self._raw.hexdigest()
+
+    @staticmethod
+    def _open_text(pathname):
+        return open(pathname, 'r', encoding='utf-8', newline='')
+
+    @classmethod
+    def read_rows(cls, pathname):
+        """
+            Yield the header then every row as a list of strings, 'NULL' kept as is.
+        """
+        with cls._open_text(pathname=pathname) as fr:
+            yield from csv.reader(fr, delimiter=',', quotechar='|')
+
+
+class GzipCsvFormat(CsvFormat):
+    """
+        Streaming gzip compressed CSV, the gzip header carries no file name
+        nor mtime so identical tables produce identical bytes.
+    """
+    name = 'csv.gz'
+    extension = '.csv.gz'
+    indexable = False
+    compresslevel = 6
+
+    def _open(self):
+        self._raw = HashingFile(pathname=self.pathname)
+        self._compressor = gzip.GzipFile(
+            filename='', mode='wb', fileobj=self._raw, compresslevel=self.compresslevel, mtime=0)
+        self.file = io.TextIOWrapper(self._compressor, encoding='utf-8', newline='')
+
+    def close(self):
+        self.file.close()
+        self._raw.close()
+
+    @staticmethod
+    def _open_text(pathname):
+        return gzip.open(pathname, 'rt', encoding='utf-8', newline='')
+
+
+class ZstdCsvFormat(CsvFormat):
+    """
+        Streaming zstd compressed CSV, requires "zstandard".
+    """
+    name = 'csv.zst'
+    extension = '.csv.zst'
+    indexable = False
+    level = 3
+
+    @classmethod
+    def _import_zstandard(cls):
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(f'Backup format "{cls.name}" requires "zstandard"') from e
+        return zstandard
+
+    def _open(self):
+        zstandard = self._import_zstandard()
+        self._raw = HashingFile(pathname=self.pathname)
+        self._compressor = zstandard.ZstdCompressor(level=self.level).stream_writer(self._raw, closefd=False)
+        self.file = io.TextIOWrapper(self._compressor, encoding='utf-8', newline='')
+
+    def close(self):
+        self.file.close()
+        self._raw.close()
+
+    @classmethod
+    def _open_text(cls, pathname):
+        zstandard = cls._import_zstandard()
+        reader = zstandard.ZstdDecompressor().stream_reader(open(pathname, 'rb'), read_across_frames=True)
+        return io.TextIOWrapper(reader, encoding='utf-8', newline='')
+
+
+class JsonLinesFormat:
+    """
+        Newline-delimited JSON, one object per row, None written as null,
+        other non-JSON values (datetime, Decimal, ...) as str() like in CSV,
+        always UTF-8 with LF line ends so the bytes (and hashes) are the same on every host.
+    """
+    name = 'ndjson'
+    extension = '.ndjson'
+    splittable = True
+    indexable = False
+    batch_size = 1000
+
+    def __init__(self, pathname, fieldnames, column_types=None, write_header=True):
+        self.pathname = pathname
+        self.fieldnames = list(fieldnames)
+        self.column_types = column_types
+
+        self._raw = HashingFile(pathname=self.pathname)
+        self.file = io.TextIOWrapper(self._raw, encoding='utf-8', newline='')
+        self.encoder = json.JSONEncoder(ensure_ascii=False, default=str)
+
+    def write_rows(self, rows):
+        encode = self.encoder.encode
+        fieldnames = self.fieldnames
+        self.file.write(''.join([f'{encode(dict(zip(fieldnames, row)))}\n' for row in rows]))
+
+    def close(self):
+        self.file.close()
+
+    def hexdigest(self):
+        return self._raw.hexdigest()
+
+
+class ParquetFormat:
+    """
+        Typed columnar Parquet, requires "pyarrow".
+        Every batch is written as a row group as soon as it arrives,
+        the arrow type of each column comes from its SQLAlchemy type.
+    """
+    name = 'parquet'
+    extension = '.parquet'
+    splittable = False
+    indexable = False
+    batch_size = 65536
+    compression = 'snappy'
+
+    def __init__(self, pathname, fieldnames, column_types=None, write_header=True):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError(f'Backup format "{self.name}" requires "pyarrow"') from e
+        self.pa = pyarrow
+        self.pathname = pathname
+        self.fieldnames = list(fieldnames)
+        self.column_types = column_types or [None] * len(self.fieldnames)
+
+        self.schema = pyarrow.schema([
+            (name, self._get_arrow_type(column_type=column_type))
+            for name, column_type in zip(self.fieldnames, self.column_types)
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(self.pathname, self.schema, compression=self.compression)
+
+    def _get_arrow_type(self, column_type):
+        pa = self.pa
+        try:
+            python_type = getattr(column_type, 'python_type', None)
+        except NotImplementedError:
+            python_type = None
+        if python_type is bool:
+            return pa.bool_()
+        if python_type is int:
+            return pa.int64()
+        if python_type is float:
+            return pa.float64()
+        if python_type is decimal.Decimal:
+            precision = getattr(column_type, 'precision', None)
+            scale = getattr(column_type, 'scale', None)
+            if precision and scale is not None:
+                return pa.decimal128(precision, scale)
+            return pa.string()
+        if python_type is datetime.datetime:
+            return pa.timestamp('us')
+        if python_type is datetime.date:
+            return pa.date32()
+        if python_type is datetime.time:
+            return pa.time64('us')
+        if python_type is bytes:
+            return pa.binary()
+        return pa.string()
+
+    def write_rows(self, rows):
+        columns = list(zip(*rows))
+        if not columns:
+            return
+        arrays = list()
+        for values, field in zip(columns, self.schema):
+            if self.pa.types.is_string(field.type):
+                values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+            arrays.append(self.pa.array(values, type=field.type))
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+    def hexdigest(self):
+        """
+            pyarrow writes the file itself, hashed afterwards by get_file_digest.
+        """
+        return None
+
+
+class BackupFormats:
+    """
+        Registry of BackupDatabase output formats.
+        BackupFormats.get('csv.gz') -> GzipCsvFormat
+    """
+    _FORMATS = {
+        CsvFormat.name: CsvFormat,
+        GzipCsvFormat.name: GzipCsvFormat,
+        ZstdCsvFormat.name: ZstdCsvFormat,
+        JsonLinesFormat.name: JsonLinesFormat,
+        ParquetFormat.name: ParquetFormat,
+    }
+
+    @classmethod
+    def get(cls, name):
+        if name not in cls._FORMATS:
+            raise Exception(f'[{"ERROR":10}]| Invalid backup format: {name}, choose from {list(cls._FORMATS)}')
+        return cls._FORMATS[name]
+
+    @classmethod
+    def names(cls):
+        return list(cls._FORMATS)
@@ -0,0 +1,363 @@
+# built-in
+import os, io, csv, json, mmap, struct, decimal, datetime
+
+
+_KEY_TYPES = {
+    int: 'int',
+    float: 'float',
+    bool: 'bool',
+    decimal.Decimal: 'decimal',
+    datetime.datetime: 'datetime',
+    datetime.date: 'date',
+}
+_KEY_PARSERS = {
+    'int': int,
+    'float': float,
+    'bool': 'True'.__eq__,
+    'decimal': decimal.Decimal,
+    'datetime': datetime.datetime.fromisoformat,
+    'date': datetime.date.fromisoformat,
+    'str': str,
+}
+
+
+def _parse_key(values, key_types):
+    """
+        Typed key tuple from the CSV text of its values, a shorter `values` gives a key prefix.
+    """
+    return tuple(_KEY_PARSERS[key_type](value) for key_type, value in zip(key_types, values))
+
+
+class BackupIndexWriter:
+    """
+        BackupIndexWriter(pathname, key_types=('int',))
+
+        Primary key index next to a plain CSV backup, `<table_name>.csv.idx`,
+        records are appended in file order, which is primary key order for BackupDatabase.
+        備份 CSV 的主鍵索引, 記錄每一列在檔案中的位元組位置.
+
+        :key_types: type name of every primary key column, see `get_key_types`.
+            A single 'int' key is written as fixed 16 bytes records `<qQ` (key, offset),
+            other keys as a JSON header line then JSON lines `[[str(value), ...], offset]`,
+            values written like in the CSV. The header records the key types and whether the keys
+            are ascending once parsed with them, the database collation may order text differently.
+    """
+    BINARY_MAGIC = b'PKIDXQ1\n'
+    JSON_MAGIC = b'PKIDXJ2\n'
+    RECORD = struct.Struct('<qQ')
+
+    def __init__(self, pathname, key_types=('int',)):
+        self.pathname = pathname
+        self.key_types = list(key_types)
+        self.binary = self.key_types == ['int']
+        self.sorted = True
+        self._last_key = None
+
+        self.file = open(self.pathname, 'wb')
+        if self.binary:
+            self.file.write(self.BINARY_MAGIC)
+        else:
+            self.file.write(self.JSON_MAGIC + self._get_header(key_types=self.key_types, sorted_=True))
+
+    @classmethod
+    def get_pathname(cls, file_pathname):
+        return f'{file_pathname}.idx'
+
+    @staticmethod
+    def get_key_types(python_types):
+        """
+            Key type names of the python types of the primary key columns, unknown types compare as text.
+        """
+        return [_KEY_TYPES.get(python_type, 'str') for python_type in python_types]
+
+    @staticmethod
+    def _get_header(key_types, sorted_):
+        """
+            The flag is the third byte from the end so `close` can clear it in place.
+        """
+        return f'{json.dumps({"key_types": key_types, "sorted": int(sorted_)})}\n'.encode()
+
+    def _check_order(self, texts):
+        for values in texts:
+            key = _parse_key(values=values, key_types=self.key_types)
+            if self._last_key is not None and key <= self._last_key:
+                self.sorted = False
+                return
+            self._last_key = key
+
+    def _encode(self, keys, offsets):
+        if self.binary:
+            pack = self.RECORD.pack
+            return b''.join([pack(key[0], offset) for key, offset in zip(keys, offsets)])
+        texts = [[str(value) for value in key] for key in keys]
+        if self.sorted:
+            self._check_order(texts=texts)
+        return ''.join([f'{json.dumps([values, offset])}\n' for values, offset in zip(texts, offsets)]).encode()
+
+    def add(self, keys, offsets):
+        """
+            :keys: tuple of primary key values per row.
+            :offsets: byte offset of every row in the CSV.
+        """
+        self.file.write(self._encode(keys=keys, offsets=offsets))
+
+    def close(self):
+        if not self.binary and not self.sorted and not self.file.closed:
+            self.file.seek(len(self.JSON_MAGIC) + len(self._get_header(key_types=self.key_types, sorted_=True)) - 3)
+            self.file.write(b'0')
+        self.file.close()
+
+    @classmethod
+    def merge(cls, pathname, parts):
+        """
+            Concatenate the indexes of range parts into `pathname`.
+            :parts: [(part index pathname, byte offset of the part in the merged CSV), ...] in key order.
+        """
+        temp_pathname = f'{pathname}.tmp'
+        writer = None
+        try:
+            for part_pathname, base in parts:
+                with open(part_pathname, 'rb') as fr:
+                    magic = fr.read(len(cls.BINARY_MAGIC))
+                    if magic == cls.BINARY_MAGIC:
+                        writer = writer or cls(pathname=temp_pathname)
+                        pack = cls.RECORD.pack
+                        writer.file.write(b''.join([
+                            pack(key, offset + base) for key, offset in cls.RECORD.iter_unpack(fr.read())]))
+                    else:
+                        header = json.loads(fr.readline())
+                        writer = writer or cls(pathname=temp_pathname, key_types=header['key_types'])
+                        texts, offsets = list(), list()
+                        for line in fr:
+                            values, offset = json.loads(line)
+                            texts.append(values)
+                            offsets.append(offset + base)
+                        writer.add(keys=texts, offsets=offsets)
+                os.remove(part_pathname)
+        finally:
+            if writer is not None:
+                writer.close()
+        os.replace(temp_pathname, pathname)
+
+
+class BackupIndexReader:
+    """
+        BackupIndexReader(file_pathname, null=None, encoding='utf-8')
+
+        Fetch single rows or primary key ranges from a plain CSV backup through its `.idx`,
+        both files are memory mapped and only the rows asked for are parsed.
+        透過主鍵索引直接讀取備份中的單筆或範圍資料, 不需解析整個檔案.
+
+        :file_pathname: `<path>/backup_%Y_%m_%dT%H_%M/<models_name>/<table_name>.csv`.
+        :null: value returned for 'NULL' fields.
+        :encoding: encoding the CSV was written with.
+
+        Rows come back as {column_name: str}, values are the CSV text,
+        parse them with the column types when needed (see RestoreDatabase).
+        Keys are compared with the types recorded in the index, composite keys as tuples,
+        a shorter tuple in `range` matches every key it starts, e.g. range((2,), (3,)).
+        Both lookups are binary searches over the index, or a scan of the index when the database
+        ordered the keys differently (e.g. a text collation), the rows are still read from the mapped CSV.
+
+        How to use:
+            with BackupIndexReader.from_generation(
+                    path='static/backup/', models_name='models', generation='backup_2020_02_18T17_28',
+                    table_name='my_table') as reader:
+                reader.get(42)
+                list(reader.range(100, 200))
+    """
+
+    def __init__(self, file_pathname, null=None, encoding='utf-8'):
+        self.file_pathname = file_pathname
+        self.index_pathname = BackupIndexWriter.get_pathname(file_pathname=file_pathname)
+        self.null = null
+        self.encoding = encoding
+        if not os.path.exists(self.index_pathname):
+            raise Exception(f'[{"ERROR":10}]| No index for {file_pathname}, export with BackupDatabase(index=True)')
+
+        self._data_file = open(self.file_pathname, 'rb')
+        self._index_file = open(self.index_pathname, 'rb')
+        self.data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._read_index_header()
+        self.fieldnames = self._read_header()
+
+    @classmethod
+    def from_generation(cls, path, models_name, generation, table_name, **kwargs):
+        return cls(file_pathname=os.path.join(path, generation, models_name, f'{table_name}.csv'), **kwargs)
+
+    def _read_index_header(self):
+        magic = self.index[:len(BackupIndexWriter.BINARY_MAGIC)]
+        self.binary = magic == BackupIndexWriter.BINARY_MAGIC
+        if self.binary:
+            self.key_types = ['int']
+            self.sorted = True
+            self._start = len(magic)
+            return
+        if magic != BackupIndexWriter.JSON_MAGIC:
+            self.close()
+            raise Exception(f'[{"ERROR":10}]| Unsupported index {self.index_pathname}, export it again')
+        end = self.index.find(b'\n', len(magic)) + 1
+        header = json.loads(self.index[len(magic):end])
+        self.key_types = header['key_types']
+        self.sorted = bool(header['sorted'])
+        self._start = end
+
+    def __len__(self):
+        if self.binary:
+            return (len(self.index) - self._start) // BackupIndexWriter.RECORD.size
+        count = 0
+        position = self.index.find(b'\n', self._start)
+        while position != -1:
+            count += 1
+            position = self.index.find(b'\n', position + 1)
+        return count
+
+    def _get_record(self, position):
+        return BackupIndexWriter.RECORD.unpack_from(self.index, self._start + position * BackupIndexWriter.RECORD.size)
+
+    def _get_offset(self, position):
+        """
+            CSV offset of a binary record, the end of the CSV past the last one.
+        """
+        if position >= len(self):
+            return len(self.data)
+        return self._get_record(position=position)[1]
+
+    def _read_line(self, start):
+        """
+            (end of the line, typed key, CSV offset) of the JSON record starting at byte `start`.
+        """
+        end = self.index.find(b'\n', start) + 1
+        values, offset = json.loads(self.index[start:end])
+        return end, _parse_key(values=values, key_types=self.key_types), offset
+
+    def _get_line_offset(self, start):
+        if start >= len(self.index):
+            return len(self.data)
+        return self._read_line(start=start)[2]
+
+    def _iter_lines(self):
+        """
+            Yield (typed key, CSV offset, CSV offset of the next row) of every JSON record in file order.
+        """
+        start = self._start
+        if start >= len(self.index):
+            return
+        start, key, offset = self._read_line(start=start)
+        while start < len(self.index):
+            start, next_key, next_offset = self._read_line(start=start)
+            yield key, offset, next_offset
+            key, offset = next_key, next_offset
+        yield key, offset, len(self.data)
+
+    def _bisect(self, key, right=False):
+        """
+            Position of the first record with a key >= `key` (> `key` when right) in a binary index.
+        """
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            found = self._get_record(position=middle)[0]
+            if found < key or (right and found == key):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _bisect_lines(self, key, right=False):
+        """
+            Byte position of the first JSON record with a key >= `key` (> `key` when right),
+            `low` always stays at the start of a line.
+        """
+        low, high = self._start, len(self.index)
+        while low < high:
+            middle = (low + high) // 2
+            start = self.index.rfind(b'\n', low, middle) + 1 or low
+            end, found, _ = self._read_line(start=start)
+            if found < key or (right and found[:len(key)] == key):
+                low = end
+            else:
+                high = start
+        return low
+
+    def _parse(self, start, stop):
+        """
+            Parse the CSV bytes [start, stop), rows may span lines inside '|' quotes.
+        """
+        text = self.data[start:stop].decode(self.encoding)
+        for row in csv.reader(io.StringIO(text, newline=''), delimiter=',', quotechar='|'):
+            yield {name: self.null if value == 'NULL' else value for name, value in zip(self.fieldnames, row)}
+
+    def _read_header(self):
+        end = self._get_offset(position=0) if self.binary else self._get_line_offset(start=self._start)
+        text = self.data[:end].decode(self.encoding)
+        return next(csv.reader(io.StringIO(text, newline=''), delimiter=',', quotechar='|'))
+
+    def _to_key(self, key):
+        if not isinstance(key, (tuple, list)):
+            key = (key,)
+        return _parse_key(values=[str(value) for value in key], key_types=self.key_types)
+
+    def get(self, key):
+        """
+            Return the row of primary key `key`, a tuple for composite keys, None when absent.
+        """
+        if self.binary:
+            position = self._bisect(key=int(key))
+            if position < len(self) and self._get_record(position=position)[0] == int(key):
+                return next(self._parse(
+                    start=self._get_offset(position=position), stop=self._get_offset(position=position + 1)))
+            return None
+        key = self._to_key(key=key)
+        if not self.sorted:
+            for found, start, stop in self._iter_lines():
+                if found == key:
+                    return next(self._parse(start=start, stop=stop))
+            return None
+        position = self._bisect_lines(key=key)
+        if position >= len(self.index):
+            return None
+        end, found, start = self._read_line(start=position)
+        if found != key:
+            return None
+        return next(self._parse(start=start, stop=self._get_line_offset(start=end)))
+
+    def range(self, start=None, stop=None):
+        """
+            Yield the rows with `start` <= primary key <= `stop` in file order, None leaves a side open.
+        """
+        if self.binary:
+            low = 0 if start is None else self._bisect(key=int(start))
+            high = len(self) if stop is None else self._bisect(key=int(stop), right=True)
+            if low < high:
+                yield from self._parse(start=self._get_offset(position=low), stop=self._get_offset(position=high))
+            return
+        start = None if start is None else self._to_key(key=start)
+        stop = None if stop is None else self._to_key(key=stop)
+        if not self.sorted:
+            for found, low, high in self._iter_lines():
+                if (start is None or found >= start) and (stop is None or found[:len(stop)] <= stop):
+                    yield next(self._parse(start=low, stop=high))
+            return
+        low = self._start if start is None else self._bisect_lines(key=start)
+        high = len(self.index) if stop is None else self._bisect_lines(key=stop, right=True)
+        if low < high:
+            yield from self._parse(start=self._get_line_offset(start=low), stop=self._get_line_offset(start=high))
+
+    def keys(self):
+        if self.binary:
+            return [key for key, _ in BackupIndexWriter.RECORD.iter_unpack(self.index[self._start:])]
+        return [key for key, _, _ in self._iter_lines()]
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+        self._data_file.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
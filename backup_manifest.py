@@ -0,0 +1,163 @@
+# built-in
+import os, json
+from datetime import datetime, date
+from decimal import Decimal
+
+
+class BackupManifest:
+    """
+        BackupManifest(path, models_name)
+
+        JSON manifest kept next to the backup directories, `<path>/<models_name>.manifest.json`.
+        記錄每次備份(世代)與每張表的高水位, 供增量備份與合併使用.
+        {
+            'generations': [
+                {
+                    'name': 'backup_2020_02_18T17_28',
+                    'format': 'csv',
+                    'tables': {'table_name': 'full' or 'incremental', ...},
+                    'files': {
+                        'table_name': {'sha256': '...', 'bytes': 1024, 'rows': 10, 'linked': 'backup_...'},
+                        ...
+                    },
+                },
+                ...
+            ],
+            'tables': {
+                'table_name': {
+                    'column': 'updated_at',
+                    'high_water_mark': {'type': 'datetime', 'value': '2020-02-18T17:28:54'},
+                    'primary_key': ['id'],
+                    'fieldnames': ['id', ...],
+                },
+                ...
+            },
+        }
+    """
+
+    def __init__(self, path, models_name):
+        self.path = path
+        self.models_name = models_name
+        self.pathname = os.path.join(path, f'{models_name}.manifest.json')
+        self.data = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.pathname):
+            return {'generations': list(), 'tables': dict()}
+        with open(self.pathname, 'r') as fr:
+            return json.load(fr)
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        temp_pathname = f'{self.pathname}.tmp'
+        with open(temp_pathname, 'w') as fw:
+            json.dump(self.data, fw, indent=2, sort_keys=True)
+        os.replace(temp_pathname, self.pathname)
+
+    @staticmethod
+    def get_generation_name(datetime_, format_='backup_%Y_%m_%dT%H_%M'):
+        return datetime_.strftime(format_)
+
+    @staticmethod
+    def encode_value(value):
+        if isinstance(value, datetime):
+            return {'type': 'datetime', 'value': value.isoformat()}
+        if isinstance(value, date):
+            return {'type': 'date', 'value': value.isoformat()}
+        if isinstance(value, Decimal):
+            return {'type': 'decimal', 'value': str(value)}
+        return {'type': type(value).__name__, 'value': value}
+
+    @staticmethod
+    def decode_value(encoded):
+        if encoded is None:
+            return None
+        type_, value = encoded['type'], encoded['value']
+        if type_ == 'datetime':
+            return datetime.fromisoformat(value)
+        if type_ == 'date':
+            return date.fromisoformat(value)
+        if type_ == 'decimal':
+            return Decimal(value)
+        return value
+
+    @property
+    def generations(self):
+        return self.data['generations']
+
+    def get_table(self, table_name):
+        return self.data['tables'].get(table_name)
+
+    def get_high_water_mark(self, table_name, column):
+        """
+            Return the last high water mark of `column`, None if unknown.
+        """
+        table = self.get_table(table_name=table_name)
+        if table is None or table.get('column') != column:
+            return None
+        return self.decode_value(encoded=table.get('high_water_mark'))
+
+    def set_table(self, table_name, column, high_water_mark, primary_key, fieldnames):
+        previous = self.get_table(table_name=table_name)
+        if high_water_mark is None and previous is not None and previous.get('column') == column:
+            encoded = previous.get('high_water_mark')
+        else:
+            encoded = None if high_water_mark is None else self.encode_value(value=high_water_mark)
+        self.data['tables'][table_name] = {
+            'column': column,
+            'high_water_mark': encoded,
+            'primary_key': list(primary_key),
+            'fieldnames': list(fieldnames),
+        }
+
+    def add_generation(self, name, format_, tables, files=None):
+        """
+            :files: {table_name: {'sha256', 'bytes', 'rows', 'linked'}} of the files written,
+                'linked' names the generation a deduplicated file is hard linked to.
+        """
+        self.data['generations'] = [_ for _ in self.generations if _['name'] != name]
+        generation = {'name': name, 'format': format_, 'tables': dict(tables)}
+        if files:
+            generation['files'] = dict(files)
+        self.data['generations'].append(generation)
+        self.data['generations'].sort(key=lambda generation: generation['name'])
+
+    def remove_generation(self, name):
+        self.data['generations'] = [_ for _ in self.generations if _['name'] != name]
+
+    def get_previous_file(self, table_name, before, format_):
+        """
+            Return (generation, file record) of the newest generation before `before` holding the table,
+            None when that generation has another format or no record of the file.
+        """
+        for generation in reversed(self.generations):
+            if generation['name'] >= before or table_name not in generation['tables']:
+                continue
+            record = generation.get('files', dict()).get(table_name)
+            if generation['format'] != format_ or record is None:
+                return None
+            return generation, record
+        return None
+
+    def get_generation(self, name):
+        for generation in self.generations:
+            if generation['name'] == name:
+                return generation
+        return None
+
+    def get_chain(self, table_name, until=None):
+        """
+            Return the generations needed to rebuild a table:
+            its latest full generation followed by every later incremental one.
+            :until: ignore generations after this generation name.
+        """
+        chain = list()
+        for generation in self.generations:
+            if until is not None and generation['name'] > until:
+                break
+            mode = generation['tables'].get(table_name)
+            if mode == 'full':
+                chain = [generation]
+            elif mode == 'incremental' and chain:
+                chain.append(generation)
+        return chain
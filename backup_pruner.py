@@ -0,0 +1,104 @@
+# built-in
+import os, shutil, argparse
+from datetime import datetime, timedelta
+# submodule
+from scraping_tools.backup_manifest import BackupManifest
+
+
+class BackupPruner:
+    """
+        BackupPruner(path, models_name, keep=None, keep_days=None, now=None, dry_run=False)
+
+        Drop old generations recorded in the manifest, a generation still needed to rebuild
+        any table of a kept generation (its full generation and the incremental ones before it) is kept as well.
+        Deduplicated files are hard links, removing one generation never removes the data of another.
+        依保留策略刪除舊的備份世代, 保留的世代所依賴的完整/增量備份不會被刪除.
+
+        :path: same as BackupDatabase.path.
+        :keep: keep the newest `keep` generations.
+        :keep_days: keep the generations made within `keep_days` days before `now`.
+        :dry_run: only print what would be removed.
+
+        The newest generation is always kept, directories missing from the manifest are left untouched.
+
+        How to use:
+            BackupPruner(path='static/backup/', models_name='models', keep=7)
+            python -m scraping_tools.backup_pruner static/backup/ models --keep 7 --dry-run
+    """
+
+    def __init__(self, path, models_name, keep=None, keep_days=None, now=None, dry_run=False):
+        if keep is None and keep_days is None:
+            raise Exception(f'[{"ERROR":10}]| Give `keep` and/or `keep_days` to prune {path}')
+        self.path = path
+        self.models_name = models_name
+        self.keep = keep
+        self.keep_days = keep_days
+        self.now = now or datetime.now()
+        self.dry_run = dry_run
+        self.manifest = BackupManifest(path=path, models_name=models_name)
+        self.removed = list()
+
+        self._run()
+
+    def _get_kept(self):
+        """
+            Generation names kept by the retention policy alone.
+        """
+        names = [generation['name'] for generation in self.manifest.generations]
+        kept = set(names[-1:])
+        if self.keep:
+            kept.update(names[-self.keep:])
+        if self.keep_days is not None:
+            since = self.manifest.get_generation_name(datetime_=self.now - timedelta(days=self.keep_days))
+            kept.update(name for name in names if name >= since)
+        return kept
+
+    def _get_required(self, kept):
+        """
+            Add the generations the chain of every table of a kept generation goes through.
+        """
+        required = set(kept)
+        for name in kept:
+            for table_name in self.manifest.data['tables']:
+                for generation in self.manifest.get_chain(table_name=table_name, until=name):
+                    required.add(generation['name'])
+        return required
+
+    def _remove(self, name):
+        backup_path = os.path.join(self.path, name, self.models_name)
+        if os.path.isdir(backup_path):
+            shutil.rmtree(backup_path)
+        generation_path = os.path.join(self.path, name)
+        if os.path.isdir(generation_path) and not os.listdir(generation_path):
+            os.rmdir(generation_path)
+
+    def _run(self):
+        required = self._get_required(kept=self._get_kept())
+        action = 'DRY RUN' if self.dry_run else 'PRUNE'
+        for generation in list(self.manifest.generations):
+            name = generation['name']
+            if name in required:
+                continue
+            if not self.dry_run:
+                self._remove(name=name)
+                self.manifest.remove_generation(name=name)
+                self.manifest.save()
+            self.removed.append(name)
+            print(f'[{action:10}]| {name}/{self.models_name}')
+        print(f'[{action:10}]| {len(self.removed)} removed, {len(required)} kept')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drop old backup generations, see BackupPruner.')
+    parser.add_argument('path')
+    parser.add_argument('models_name')
+    parser.add_argument('--keep', type=int)
+    parser.add_argument('--keep-days', type=float)
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+    BackupPruner(
+        path=args.path, models_name=args.models_name, keep=args.keep, keep_days=args.keep_days, dry_run=args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
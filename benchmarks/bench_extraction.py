@@ -0,0 +1,68 @@
+"""
+    Rows/sec of the ORM and the column-projected (Core) extraction modes.
+    比較 ORM 與 Core 欄位投影兩種擷取模式的速度, 並確認 CSV 輸出完全一致.
+
+    python -m scraping_tools.benchmarks.bench_extraction --rows 100000 --width 20
+"""
+# built-in
+import os, argparse, contextlib, hashlib, shutil, tempfile, time
+from datetime import datetime
+# submodule
+from scraping_tools.backup_database import BackupDatabase
+from scraping_tools.benchmarks.synthetic import SyntheticDatabase
+
+
+def _bench_mode(table, projected, repeat):
+    column_names = BackupDatabase.get_column_names(table=table)
+    best = None
+    quantity = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        quantity = 0
+        reader = BackupDatabase._get_reader(table=table, column_names=column_names, projected=projected)
+        for row in BackupDatabase._iter_rows(reader=reader, column_names=column_names):
+            dict(zip(column_names, row))
+            quantity += 1
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return quantity, best
+
+
+def _hash_backup(models, projected, path):
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        BackupDatabase(models=models, models_name='bench', now=datetime(2020, 1, 1), path=path, projected=projected)
+    digests = dict()
+    for root, _, files in os.walk(path):
+        for name in files:
+            with open(os.path.join(root, name), 'rb') as fr:
+                digests[name] = hashlib.sha256(fr.read()).hexdigest()
+    return digests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--width', type=int, default=16)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_extraction_')
+    try:
+        synthetic = SyntheticDatabase(
+            pathname=os.path.join(workdir, 'bench.db'), rows=args.rows, width=args.width)
+        table = synthetic.models.SyntheticTable0
+        with synthetic.app.app_context():
+            for projected in (False, True):
+                quantity, elapsed = _bench_mode(table=table, projected=projected, repeat=args.repeat)
+                mode = 'core' if projected else 'orm'
+                print(f'[{mode.upper():10}]| {quantity:,} rows | {elapsed:.3f} sec. | {quantity / elapsed:,.0f} rows/sec')
+            orm_digests = _hash_backup(models=synthetic.models, projected=False, path=os.path.join(workdir, 'orm'))
+            core_digests = _hash_backup(models=synthetic.models, projected=True, path=os.path.join(workdir, 'core'))
+        identical = orm_digests == core_digests
+        print(f'[{"IDENTICAL":10}]| {identical}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
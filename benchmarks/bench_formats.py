@@ -0,0 +1,63 @@
+"""
+    Size and write time of every BackupDatabase output format.
+    比較各備份輸出格式的檔案大小與寫入時間.
+
+    python -m scraping_tools.benchmarks.bench_formats --rows 100000 --width 20
+"""
+# built-in
+import os, argparse, contextlib, shutil, tempfile, time
+from datetime import datetime
+# submodule
+from scraping_tools.backup_database import BackupDatabase
+from scraping_tools.backup_formats import BackupFormats
+from scraping_tools.benchmarks.synthetic import SyntheticDatabase
+
+
+def _get_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            size += os.path.getsize(os.path.join(root, name))
+    return size
+
+
+def _bench_format(models, format_, path, workers):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        BackupDatabase(
+            models=models, models_name='bench', now=datetime(2020, 1, 1), path=path,
+            projected=True, workers=workers, format_=format_)
+    return time.perf_counter() - start, _get_size(path=path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--width', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--formats', nargs='*', default=BackupFormats.names())
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_formats_')
+    try:
+        synthetic = SyntheticDatabase(
+            pathname=os.path.join(workdir, 'bench.db'), rows=args.rows, width=args.width)
+        baseline_size = None
+        with synthetic.app.app_context():
+            for format_ in args.formats:
+                path = os.path.join(workdir, format_)
+                try:
+                    elapsed, size = _bench_format(
+                        models=synthetic.models, format_=format_, path=path, workers=args.workers)
+                except ImportError as e:
+                    print(f'[{format_.upper():10}]| skipped: {e}')
+                    continue
+                baseline_size = baseline_size or size
+                print(f'[{format_.upper():10}]| {elapsed:.3f} sec. | {size:,} bytes '
+                    f'| {size / baseline_size:.1%} of {args.formats[0]} | {args.rows / elapsed:,.0f} rows/sec')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
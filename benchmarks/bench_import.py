@@ -0,0 +1,82 @@
+"""
+    Import time of every module, measured with `python -X importtime` in a fresh interpreter.
+    Exit with status 1 when a light module goes over its budget, to guard worker start-up time.
+    量測各模組匯入時間, 輕量模組超過預算時回傳錯誤碼.
+
+    python -m scraping_tools.benchmarks.bench_import --repeat 5
+"""
+# built-in
+import os, sys, json, argparse, subprocess
+# submodule
+import scraping_tools
+
+
+# milliseconds, cumulative import time of the module and everything it pulls in
+BUDGETS = {
+    'utils': 25,
+    'timing_stats': 20,
+    'progress_bar': 25,
+    'snap_timer': 25,
+    'temp_logging': 20,
+    'super_print': 5,
+    'log_handlers': 60,
+    'log_stash': 40,
+    'model_registry': 25,
+}
+# need SQLAlchemy, asyncio or the backup formats, reported without a budget
+HEAVY = ('async_snap_timer', 'keyset_reader', 'model_extractor', 'chunk_pool', 'backup_formats', 'backup_database',
+    'restore_database')
+
+
+def _get_root():
+    return os.path.dirname(list(scraping_tools.__path__)[0])
+
+
+def _import_time(module, root):
+    """
+        Return the cumulative import time of `module` in microseconds.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    name = f'scraping_tools.{module}'
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {name}'],
+        env=env, cwd=root, capture_output=True, text=True)
+    if completed.returncode:
+        raise Exception(f'[{"ERROR":10}]| import {name} failed:\n{completed.stderr[-2000:]}')
+    for line in completed.stderr.splitlines():
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == name:
+            return int(parts[1])
+    raise Exception(f'[{"ERROR":10}]| {name} missing in the -X importtime output')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per module, the fastest counts')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply every budget, for slow machines')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    root = _get_root()
+    results = dict()
+    failed = list()
+    for module in list(BUDGETS) + list(HEAVY):
+        milliseconds = min(_import_time(module=module, root=root) for _ in range(args.repeat)) / 1000
+        budget = BUDGETS.get(module)
+        results[module] = {'milliseconds': round(milliseconds, 2), 'budget': budget and budget * args.scale}
+        over = budget is not None and milliseconds > budget * args.scale
+        if over:
+            failed.append(module)
+        if not args.json:
+            budget_info = f'{budget * args.scale:8.1f} ms' if budget is not None else f'{"-":>8} ms'
+            status = 'OVER' if over else ('OK' if budget is not None else '')
+            print(f'[{"IMPORT":10}]| {module:21}| {milliseconds:8.2f} ms | budget {budget_info} | {status}')
+    if args.json:
+        print(json.dumps(results, indent=2))
+    if failed:
+        print(f'[{"ERROR":10}]| over budget: {", ".join(failed)}', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+    Calls per second of LogStash with the debug level enabled and disabled.
+    比較 LogStash 在 DEBUG 開啟與關閉時每秒可呼叫次數.
+
+    python -m scraping_tools.benchmarks.bench_log_stash --calls 100000
+"""
+# built-in
+import os, sys, argparse, logging, shutil, tempfile, time
+
+
+def _import_log_stash(workdir):
+    """
+        LogStash reads `config.Config` and writes under the working directory once started.
+    """
+    with open(os.path.join(workdir, 'config.py'), 'w') as fw:
+        fw.write("class Config:\n    SYSTEM_NAME = 'bench'\n")
+    sys.path.insert(0, workdir)
+    os.chdir(workdir)
+    from scraping_tools.log_stash import LogStash
+    return LogStash
+
+
+def _summary(rows):
+    return ', '.join(f'{key}={value}' for key, value in rows.items())
+
+
+def _bench(method, calls, *args, **kwargs):
+    start = time.perf_counter()
+    for _ in range(calls):
+        method(*args, **kwargs)
+    return calls / (time.perf_counter() - start)
+
+
+def _bench_error(method, calls):
+    start = time.perf_counter()
+    for index in range(calls):
+        try:
+            raise ValueError(index)
+        except ValueError as e:
+            method(e, 'failed at %s', index)
+    return calls / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=50000)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='bench_log_stash_')
+    try:
+        LogStash = _import_log_stash(workdir=workdir)
+        LogStash.start_logging()
+        for handler in logging.getLogger().handlers:
+            if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+                handler.setStream(open(os.devnull, 'w'))
+        rows = {'url': 'https://example.com', 'count': 2000, 'elapsed': 1.5}
+        cases = (
+            ('debug %-args', lambda: _bench(LogStash.debug, args.calls, None, 'fetched %s rows from %s', 2000, 'url')),
+            ('debug lazy', lambda: _bench(LogStash.debug, args.calls, msg=lambda: _summary(rows))),
+            ('warning %-args', lambda: _bench(LogStash.warning, args.calls, None, 'retry %s', 3)),
+            ('error traceback', lambda: _bench_error(LogStash.error, args.calls // 10)),
+        )
+        for level in (logging.DEBUG, logging.INFO, logging.CRITICAL):
+            LogStash.set_level(level)
+            for name, case in cases:
+                print(f'[{logging.getLevelName(level):10}]| {name:16}| {case():,.0f} calls/sec', flush=True)
+        LogStash.stop_logging()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+    Case conversion of Utils against the previous per-character implementations.
+    比較 Utils 大小寫轉換與舊版實作的速度.
+
+    python -m scraping_tools.benchmarks.bench_utils --calls 200000
+"""
+# built-in
+import argparse, time
+# submodule
+from scraping_tools.utils import Utils
+
+
+def _legacy_camel_to_underscore(letters, delimiter='_'):
+    if letters.islower():
+        return letters
+    result = ''.join([f'{delimiter}{_.lower()}' if _.isupper() else _ for _ in letters])
+    return result.lstrip(delimiter)
+
+
+def _legacy_underscore_to_camel(letters, delimiter='_'):
+    if delimiter not in letters:
+        return letters.title()
+    return letters.title().replace(delimiter, '')
+
+
+def _legacy_keys_to_underscore(rows):
+    return [{_legacy_camel_to_underscore(key): value for key, value in row.items()} for row in rows]
+
+
+def _bench(function, values, calls):
+    start = time.perf_counter()
+    for index in range(calls):
+        function(values[index % len(values)])
+    return calls / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--width', type=int, default=20)
+    args = parser.parse_args()
+
+    camels = ['MyModelName', 'HTTPResponse', 'ScrapeTarget2', 'UserAccountHistoryLog', 'PriceSnapshot']
+    underscores = [Utils.camel_to_underscore(letters=letters) for letters in camels]
+    cases = (
+        ('camel_to_underscore', _legacy_camel_to_underscore, Utils.camel_to_underscore, camels),
+        ('underscore_to_camel', _legacy_underscore_to_camel, Utils.underscore_to_camel, underscores),
+    )
+    for name, legacy, current, values in cases:
+        legacy_rate = _bench(function=legacy, values=values, calls=args.calls)
+        current_rate = _bench(function=current, values=values, calls=args.calls)
+        print(f'[{"BENCH":10}]| {name:21}| legacy {legacy_rate:>12,.0f} calls/sec '
+            f'| current {current_rate:>12,.0f} calls/sec | x{current_rate / legacy_rate:.1f}')
+
+    keys = [f'columnName{index}Value' for index in range(args.width)]
+    rows = [{key: index for key in keys} for index in range(args.rows)]
+    start = time.perf_counter()
+    _legacy_keys_to_underscore(rows)
+    legacy_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    Utils.keys_to_underscore(rows)
+    current_elapsed = time.perf_counter() - start
+    print(f'[{"BENCH":10}]| {"keys_to_underscore":21}| legacy {args.rows / legacy_elapsed:>12,.0f} rows/sec '
+        f'| current {args.rows / current_elapsed:>12,.0f} rows/sec | x{legacy_elapsed / current_elapsed:.1f}')
+
+
+if __name__ == '__main__':
+    main()
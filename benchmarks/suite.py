@@ -0,0 +1,259 @@
+"""
+    Benchmark suite of the extraction and backup paths on a synthetic SQLite database.
+    Every stage runs in a fresh interpreter so its peak RSS is its own,
+    results are written as JSON and can be compared against a stored baseline.
+    以合成資料庫分段量測擷取與備份流程, 輸出 JSON 並可與基準比較.
+
+    python -m scraping_tools.benchmarks.suite --rows 100000 --width 20 --output result.json
+    python -m scraping_tools.benchmarks.suite --baseline baseline.json --tolerance 0.9
+
+    Stages:
+        slice_query_orm / slice_query_core: keyset pages through the ORM or Core column projection.
+        dict_orm / dict_core:               ModelExtractor dict conversion of rows already in memory.
+        csv_export / csv_export_parallel:   BackupDatabase to CSV, sequential or with `--workers`.
+        progress_bar:                       LiveProgressBar.update calls, one per row, drawn to a fake terminal.
+        log_stash:                          LogStash.debug calls with %-args, one per row.
+"""
+# built-in
+import os, sys, json, time, argparse, platform, resource, shutil, subprocess, tempfile, contextlib
+from datetime import datetime
+
+
+STAGES = (
+    'slice_query_orm', 'slice_query_core', 'dict_orm', 'dict_core', 'csv_export', 'csv_export_parallel',
+    'progress_bar', 'log_stash',
+)
+
+
+def _get_peak_rss():
+    """
+        Peak resident set size of this process in MB, ru_maxrss is KB on Linux and bytes on macOS.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / 1024 ** 2
+    return peak / 1024
+
+
+class _NullTerminal:
+    """
+        os.devnull claiming to be a terminal, so LiveProgressBar draws instead of taking its no-op path.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def isatty(self):
+        return True
+
+    def write(self, text):
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def _slice_query(synthetic, args, projected):
+    from scraping_tools.keyset_reader import KeysetReader
+    from scraping_tools.model_registry import ModelRegistry
+    table = synthetic.models.SyntheticTable0
+    columns = ModelRegistry.get(model=table).columns if projected else None
+    start = time.perf_counter()
+    quantity = 0
+    for page in KeysetReader(table=table, slice_length=args.slice_length, columns=columns).iter_pages():
+        quantity += len(page)
+    return quantity, time.perf_counter() - start
+
+
+def _dict_conversion(synthetic, args, projected):
+    from scraping_tools.model_extractor import ModelExtractor
+    extractor = ModelExtractor(
+        table=synthetic.models.SyntheticTable0, slice_num=args.slice_length, projected=projected, lazy=True)
+    objects = extractor._slice_query()
+    start = time.perf_counter()
+    rows = [extractor._to_dict(obj) for obj in objects]
+    return len(rows), time.perf_counter() - start
+
+
+def _csv_export(synthetic, args, workers):
+    from scraping_tools.backup_database import BackupDatabase
+    path = tempfile.mkdtemp(prefix='bench_suite_export_')
+    try:
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as stream, contextlib.redirect_stdout(stream):
+            BackupDatabase(
+                models=synthetic.models, models_name='bench', now=datetime(2020, 1, 1), path=path,
+                projected=True, workers=workers)
+        return args.rows * args.tables, time.perf_counter() - start
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _progress_bar(synthetic, args):
+    from scraping_tools.progress_bar import LiveProgressBar
+    with open(os.devnull, 'w') as stream:
+        start = time.perf_counter()
+        bar = LiveProgressBar(amount=args.rows, info='bench', desc='progress_bar', stream=_NullTerminal(stream=stream))
+        for _ in range(args.rows):
+            bar.update(1)
+        bar.close()
+        return args.rows, time.perf_counter() - start
+
+
+def _log_stash(synthetic, args):
+    from scraping_tools.log_stash import LogStash
+    cwd = os.getcwd()
+    path = tempfile.mkdtemp(prefix='bench_suite_log_')
+    try:
+        os.chdir(path)
+        LogStash.init(do_print=False, title='bench', abs_path=path)
+        start = time.perf_counter()
+        for index in range(args.rows):
+            LogStash.debug(None, 'row %s of %s', index, 'bench')
+        elapsed = time.perf_counter() - start
+        LogStash.stop_logging()
+        return args.rows, elapsed
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _run_stage(stage, synthetic, args):
+    if stage.startswith('slice_query'):
+        return _slice_query(synthetic=synthetic, args=args, projected=stage.endswith('core'))
+    if stage.startswith('dict'):
+        return _dict_conversion(synthetic=synthetic, args=args, projected=stage.endswith('core'))
+    if stage == 'csv_export':
+        return _csv_export(synthetic=synthetic, args=args, workers=1)
+    if stage == 'csv_export_parallel':
+        return _csv_export(synthetic=synthetic, args=args, workers=args.workers)
+    if stage == 'progress_bar':
+        return _progress_bar(synthetic=synthetic, args=args)
+    if stage == 'log_stash':
+        return _log_stash(synthetic=synthetic, args=args)
+    raise Exception(f'[{"ERROR":10}]| Unknown stage: {stage}, choose from {STAGES}')
+
+
+def _child(args):
+    """
+        Run one stage `--repeat` times in this interpreter and print its result as JSON.
+    """
+    from scraping_tools.benchmarks.synthetic import SyntheticDatabase
+    synthetic = SyntheticDatabase(
+        pathname=args.database, rows=args.rows, width=args.width, tables=args.tables, seed=args.seed, reuse=True)
+    rss_before = _get_peak_rss()
+    best = None
+    quantity = 0
+    with synthetic.app.app_context():
+        for _ in range(args.repeat):
+            quantity, elapsed = _run_stage(stage=args.stage, synthetic=synthetic, args=args)
+            best = elapsed if best is None else min(best, elapsed)
+    print(json.dumps({
+        'rows': quantity,
+        'wall_sec': round(best, 6),
+        'rows_per_sec': round(quantity / best, 1) if best else None,
+        'peak_rss_mb': round(_get_peak_rss(), 1),
+        'peak_rss_delta_mb': round(_get_peak_rss() - rss_before, 1),
+    }))
+
+
+def _get_child_command(args, stage, database):
+    return [
+        sys.executable, '-m', 'scraping_tools.benchmarks.suite', '--child', '--stage', stage,
+        '--database', database, '--rows', str(args.rows), '--width', str(args.width), '--tables', str(args.tables),
+        '--seed', str(args.seed), '--repeat', str(args.repeat), '--workers', str(args.workers),
+        '--slice-length', str(args.slice_length),
+    ]
+
+
+def _get_meta(args):
+    import sqlalchemy
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'platform': platform.platform(),
+        'rows': args.rows,
+        'width': args.width,
+        'tables': args.tables,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'workers': args.workers,
+        'slice_length': args.slice_length,
+    }
+
+
+def _compare(results, baseline, tolerance):
+    """
+        Print the speed ratio of every stage against the baseline, return the stages slower than `tolerance`.
+    """
+    regressions = list()
+    for stage, result in results['stages'].items():
+        reference = baseline.get('stages', dict()).get(stage)
+        if not reference or not reference.get('rows_per_sec') or not result.get('rows_per_sec'):
+            continue
+        ratio = result['rows_per_sec'] / reference['rows_per_sec']
+        rss_ratio = result['peak_rss_mb'] / reference['peak_rss_mb'] if reference.get('peak_rss_mb') else None
+        status = 'REGRESSION' if ratio < tolerance else 'OK'
+        if ratio < tolerance:
+            regressions.append(stage)
+        rss_info = f'x{rss_ratio:.2f}' if rss_ratio is not None else '-'
+        print(f'[{"COMPARE":10}]| {stage:21}| speed x{ratio:.2f} | peak rss {rss_info} | {status}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--width', type=int, default=16)
+    parser.add_argument('--tables', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage, the fastest counts')
+    parser.add_argument('--workers', type=int, default=4, help='workers of csv_export_parallel')
+    parser.add_argument('--slice-length', type=int, default=2000)
+    parser.add_argument('--stages', nargs='*', default=list(STAGES), choices=STAGES)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.9, help='slowest accepted speed ratio to the baseline')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--stage', help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args=args)
+        return
+
+    from scraping_tools.benchmarks.synthetic import SyntheticDatabase
+    workdir = tempfile.mkdtemp(prefix='bench_suite_')
+    try:
+        database = os.path.join(workdir, 'bench.db')
+        SyntheticDatabase(pathname=database, rows=args.rows, width=args.width, tables=args.tables, seed=args.seed)
+        results = {'meta': _get_meta(args=args), 'stages': dict()}
+        for stage in args.stages:
+            completed = subprocess.run(
+                _get_child_command(args=args, stage=stage, database=database),
+                capture_output=True, text=True, cwd=os.getcwd())
+            if completed.returncode:
+                raise Exception(f'[{"ERROR":10}]| stage {stage} failed:\n{completed.stderr[-2000:]}')
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            results['stages'][stage] = result
+            print(f'[{"BENCH":10}]| {stage:21}| {result["rows"]:>10,} rows | {result["wall_sec"]:8.3f} sec. '
+                f'| {result["rows_per_sec"]:>12,.0f} rows/sec | peak rss {result["peak_rss_mb"]:8.1f} MB', flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as fw:
+            json.dump(results, fw, indent=2)
+    if args.baseline:
+        with open(args.baseline) as fr:
+            baseline = json.load(fr)
+        regressions = _compare(results=results, baseline=baseline, tolerance=args.tolerance)
+        if regressions:
+            print(f'[{"ERROR":10}]| slower than the baseline: {", ".join(regressions)}', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# built-in
+import os, types, random
+from datetime import datetime, timedelta
+from decimal import Decimal
+# 3rd-party
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+
+class SyntheticDatabase:
+    """
+        SyntheticDatabase(pathname, rows=10000, width=8, tables=1, seed=0, reuse=False)
+
+        Build flask_sqlalchemy models on a local SQLite file and fill them
+        with deterministic rows, for benchmarks only.
+        建立 SQLite 測試資料庫與模型, 供效能測試使用.
+
+        :rows: rows per table.
+        :width: data columns per table, primary key not included.
+        :tables: number of models.
+        :reuse: only declare the models on an existing file built with the same arguments.
+
+        How to use:
+            synthetic = SyntheticDatabase(pathname='/tmp/bench.db', rows=100000, width=20)
+            with synthetic.app.app_context():
+                BackupDatabase(models=synthetic.models, models_name='bench', ...)
+    """
+    _COLUMN_TYPES = ('String', 'Integer', 'Float', 'DateTime', 'Boolean', 'Numeric', 'Text')
+
+    def __init__(self, pathname, rows=10000, width=8, tables=1, seed=0, reuse=False):
+        self.pathname = os.path.abspath(pathname)
+        self.rows = rows
+        self.width = width
+        self.tables = tables
+        self.seed = seed
+        self.reuse = reuse
+
+        self.app = self._get_app()
+        self.db = SQLAlchemy(self.app)
+        self.models = types.ModuleType('synthetic_models')
+
+        self._run()
+
+    def _get_app(self):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.pathname}'
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        return app
+
+    def _get_column(self, index):
+        type_name = self._COLUMN_TYPES[index % len(self._COLUMN_TYPES)]
+        if type_name == 'String':
+            return self.db.Column(self.db.String(64))
+        if type_name == 'Numeric':
+            return self.db.Column(self.db.Numeric(12, 2))
+        return self.db.Column(getattr(self.db, type_name))
+
+    def _get_value(self, rand, index):
+        type_name = self._COLUMN_TYPES[index % len(self._COLUMN_TYPES)]
+        if rand.random() < 0.05:
+            return None
+        if type_name == 'String':
+            return f'value|{rand.randrange(10 ** 6)},"quoted"'
+        if type_name == 'Integer':
+            return rand.randrange(-10 ** 9, 10 ** 9)
+        if type_name == 'Float':
+            return rand.random() * 10 ** 6
+        if type_name == 'DateTime':
+            return datetime(2020, 1, 1) + timedelta(seconds=rand.randrange(10 ** 8))
+        if type_name == 'Boolean':
+            return rand.random() < 0.5
+        if type_name == 'Numeric':
+            return Decimal(rand.randrange(10 ** 8)) / 100
+        return 'text ' * rand.randrange(1, 20)
+
+    def _create_model(self, table_index):
+        name = f'SyntheticTable{table_index}'
+        attrs = {
+            '__tablename__': f'synthetic_table_{table_index}',
+            'id': self.db.Column(self.db.Integer, primary_key=True),
+        }
+        for index in range(self.width):
+            attrs[f'column_{index}'] = self._get_column(index=index)
+        model = type(name, (self.db.Model,), attrs)
+        setattr(self.models, name, model)
+        return model
+
+    def _fill(self, model, batch_size=5000):
+        rand = random.Random(self.seed)
+        insert = model.__table__.insert()
+        for start in range(0, self.rows, batch_size):
+            batch = list()
+            for pk in range(start + 1, min(start + batch_size, self.rows) + 1):
+                row = {f'column_{index}': self._get_value(rand=rand, index=index) for index in range(self.width)}
+                row['id'] = pk
+                batch.append(row)
+            self.db.session.execute(insert, batch)
+        self.db.session.commit()
+
+    def _run(self):
+        if self.reuse and os.path.exists(self.pathname):
+            for index in range(self.tables):
+                self._create_model(table_index=index)
+            return
+        if os.path.exists(self.pathname):
+            os.remove(self.pathname)
+        with self.app.app_context():
+            models = [self._create_model(table_index=index) for index in range(self.tables)]
+            self.db.create_all()
+            for model in models:
+                self._fill(model=model)
@@ -0,0 +1,162 @@
+# built-in
+import os, pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+
+_PROTOCOL = 5
+_transform = None
+
+
+def _init_worker(transform, initializer, initargs):
+    global _transform
+    _transform = transform
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _load(payload):
+    """
+        payload: ('bytes', pickled chunk, size) or ('shared_memory', block name, size).
+    """
+    kind, value, size = payload
+    if kind == 'bytes':
+        return pickle.loads(value)
+    from multiprocessing import shared_memory
+    memory = shared_memory.SharedMemory(name=value)
+    view = memory.buf[:size]
+    try:
+        return pickle.loads(view)
+    finally:
+        view.release()
+        memory.close()
+
+
+def _run_chunk(payload):
+    return pickle.dumps(_transform(_load(payload)), protocol=_PROTOCOL)
+
+
+class ChunkPool:
+    """
+        ChunkPool(transform, workers=None, max_in_flight=None, ordered=True, shared_memory_bytes=1048576,
+            mp_context=None, initializer=None, initargs=())
+
+        Stream chunks to a process pool running `transform(chunk)`, the chunks are read while
+        the workers transform the previous ones, at most `max_in_flight` chunks wait in the pool.
+        以多行程處理資料區塊, 讀取與轉換同時進行, 並限制排隊中的區塊數量.
+
+        :transform: picklable function (module level), receives a chunk and returns anything picklable.
+        :workers: processes, default to os.cpu_count().
+        :max_in_flight: chunks submitted and not yet yielded, default to `workers * 2`,
+            reading stops until a result is taken.
+        :ordered: yield results in chunk order, else as soon as they are done.
+        :shared_memory_bytes: chunks are pickled with protocol 5, larger ones go through shared memory
+            instead of the pool pipe, 0 never.
+        :initializer, initargs: called once in every worker, e.g. to load lookup tables.
+
+        How to use:
+            def normalize(rows):
+                return [...]
+
+            with ChunkPool(transform=normalize, workers=4) as pool:
+                for result in pool.map(chunks):
+                    ...
+    """
+
+    def __init__(self, transform, workers=None, max_in_flight=None, ordered=True, shared_memory_bytes=1 << 20,
+            mp_context=None, initializer=None, initargs=()):
+        self.transform = transform
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.ordered = ordered
+        self.shared_memory_bytes = shared_memory_bytes
+        self.mp_context = mp_context
+        self.initializer = initializer
+        self.initargs = initargs
+
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=self.mp_context, initializer=_init_worker,
+                initargs=(self.transform, self.initializer, self.initargs))
+        return self._executor
+
+    def _dump(self, chunk):
+        """
+            Return (payload, shared memory block or None) of a chunk.
+        """
+        data = pickle.dumps(chunk, protocol=_PROTOCOL)
+        if not self.shared_memory_bytes or len(data) < self.shared_memory_bytes:
+            return ('bytes', data, len(data)), None
+        from multiprocessing import shared_memory
+        memory = shared_memory.SharedMemory(create=True, size=len(data))
+        memory.buf[:len(data)] = data
+        return ('shared_memory', memory.name, len(data)), memory
+
+    @staticmethod
+    def _release(memory):
+        if memory is None:
+            return
+        memory.close()
+        try:
+            memory.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _submit(self, chunk):
+        payload, memory = self._dump(chunk=chunk)
+        try:
+            return self._get_executor().submit(_run_chunk, payload), memory
+        except BaseException:
+            self._release(memory=memory)
+            raise
+
+    def _collect(self, pending):
+        """
+            Yield the oldest result (ordered) or the oldest finished one, waiting for it.
+            Only the yielded chunk leaves `pending`, the others stay there for `map` to release.
+        """
+        if self.ordered:
+            future, memory = pending.popleft()
+        else:
+            done, _ = wait([future for future, _ in pending], return_when=FIRST_COMPLETED)
+            future, memory = next(item for item in pending if item[0] in done)
+            pending.remove((future, memory))
+        try:
+            result = future.result()
+        finally:
+            self._release(memory=memory)
+        yield pickle.loads(result)
+
+    def map(self, chunks):
+        """
+            Yield `transform(chunk)` for every chunk of the iterable, an exception of a worker is raised here
+            and the chunks still queued are cancelled.
+        """
+        pending = deque()
+        try:
+            for chunk in chunks:
+                while len(pending) >= self.max_in_flight:
+                    yield from self._collect(pending=pending)
+                pending.append(self._submit(chunk=chunk))
+            while pending:
+                yield from self._collect(pending=pending)
+        finally:
+            for future, memory in pending:
+                future.cancel()
+            wait([future for future, _ in pending if not future.cancelled()])
+            for _, memory in pending:
+                self._release(memory=memory)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
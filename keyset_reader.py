@@ -0,0 +1,159 @@
+# 3rd-party
+from sqlalchemy import select, tuple_
+# submodule
+from scraping_tools.model_registry import ModelRegistry
+
+
+class KeysetReader:
+    """
+        KeysetReader(table, slice_length=2000, session=None, columns=None, after=None, until=None, where=None)
+
+        Iterate a table page by page in primary key order (keyset pagination).
+        Every page is fetched with `WHERE pk > :last ORDER BY pk LIMIT :slice_length`,
+        so the cost of a page stays flat however deep into the table it is,
+        and only one page is held in memory at a time.
+        依主鍵分頁迭代資料表, 取代 OFFSET/LIMIT, 每頁成本固定且記憶體只保留一頁.
+
+        :table: flask_sqlalchemy model.
+        :slice_length: rows per page.
+        :session: optional session, default to `table.query`.
+        :columns: optional attribute names, select only these columns through
+            SQLAlchemy Core and yield plain tuples instead of ORM objects,
+            skipping identity map bookkeeping and attribute instrumentation.
+        :after: optional primary key tuple, start right after it (exclusive).
+        :until: optional primary key tuple, stop at it (inclusive).
+        :where: optional list of extra SQL expressions every row must match.
+
+        How to use:
+            for obj in KeysetReader(table=MyModel, slice_length=4000):
+                ...
+            for page in KeysetReader(table=MyModel).iter_pages():
+                ...
+            for row in KeysetReader(table=MyModel, columns=['id', 'name']):
+                ...
+    """
+
+    def __init__(self, table, slice_length=2000, session=None, columns=None, after=None, until=None, where=None):
+        self.table = table
+        self.slice_length = slice_length
+        self.session = session
+        self.columns = list(columns) if columns is not None else None
+        self.after = after
+        self.until = until
+        self.where = list(where) if where is not None else list()
+
+        meta = ModelRegistry.get(model=table)
+        self.primary_key_columns = meta.primary_key_columns
+        self.primary_key = meta.primary_key
+
+    def _get_query(self):
+        if self.session is None:
+            return self.table.query
+        return self.session.query(self.table)
+
+    def _get_after_clause(self, last_key):
+        if len(self.primary_key_columns) == 1:
+            return self.primary_key_columns[0] > last_key[0]
+        return tuple_(*self.primary_key_columns) > tuple_(*last_key)
+
+    def _get_until_clause(self, until):
+        if len(self.primary_key_columns) == 1:
+            return self.primary_key_columns[0] <= until[0]
+        return tuple_(*self.primary_key_columns) <= tuple_(*until)
+
+    def _get_clauses(self, last_key):
+        clauses = list(self.where)
+        if last_key is not None:
+            clauses.append(self._get_after_clause(last_key=last_key))
+        if self.until is not None:
+            clauses.append(self._get_until_clause(until=self.until))
+        return clauses
+
+    def _get_key(self, obj):
+        return tuple(getattr(obj, name) for name in self.primary_key)
+
+    def _get_session(self):
+        if self.session is None:
+            return self.table.query.session
+        return self.session
+
+    def _iter_object_pages(self):
+        last_key = self.after
+        while True:
+            query = self._get_query().filter(*self._get_clauses(last_key=last_key))
+            page = query.order_by(*self.primary_key_columns).limit(self.slice_length).all()
+            if not page:
+                break
+            yield page
+            if len(page) < self.slice_length:
+                break
+            last_key = self._get_key(obj=page[-1])
+
+    def _iter_projected_pages(self):
+        """
+            Select the columns plus any primary key column not among them,
+            the extra key columns are only used to seek the next page.
+        """
+        session = self._get_session()
+        selected = [getattr(self.table, name) for name in self.columns]
+        extra_keys = [name for name in self.primary_key if name not in self.columns]
+        selected.extend(getattr(self.table, name) for name in extra_keys)
+        key_indexes = [
+            self.columns.index(name) if name in self.columns else len(self.columns) + extra_keys.index(name)
+            for name in self.primary_key
+        ]
+        width = len(self.columns)
+        last_key = self.after
+        while True:
+            statement = select(*selected)
+            for clause in self._get_clauses(last_key=last_key):
+                statement = statement.where(clause)
+            statement = statement.order_by(*self.primary_key_columns).limit(self.slice_length)
+            rows = session.execute(statement).fetchall()
+            if not rows:
+                break
+            yield [tuple(row[:width]) for row in rows] if extra_keys else [tuple(row) for row in rows]
+            if len(rows) < self.slice_length:
+                break
+            last_key = tuple(rows[-1][index] for index in key_indexes)
+
+    def iter_pages(self):
+        """
+            Yield pages (lists) until the table is exhausted,
+            ORM objects by default or tuples when `columns` is given.
+        """
+        if self.columns is None:
+            return self._iter_object_pages()
+        return self._iter_projected_pages()
+
+    def count(self):
+        return self._get_query().filter(*self._get_clauses(last_key=self.after)).order_by(None).count()
+
+    def get_key_ranges(self, range_rows):
+        """
+            Split the table into primary key ranges of about `range_rows` rows,
+            return [(after, until), ...] to build one KeysetReader per range,
+            the first `after` and the last `until` are None (open ends).
+        """
+        session = self._get_session()
+        boundaries = list()
+        last_key = self.after
+        while True:
+            statement = select(*self.primary_key_columns)
+            for clause in self._get_clauses(last_key=last_key):
+                statement = statement.where(clause)
+            statement = statement.order_by(*self.primary_key_columns).offset(range_rows - 1).limit(1)
+            row = session.execute(statement).first()
+            if row is None:
+                break
+            last_key = tuple(row)
+            boundaries.append(last_key)
+        if boundaries and boundaries[-1] == self.until:
+            boundaries.pop()
+        starts = [self.after] + boundaries
+        ends = boundaries + [self.until]
+        return list(zip(starts, ends))
+
+    def __iter__(self):
+        for page in self.iter_pages():
+            yield from page
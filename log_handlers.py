@@ -0,0 +1,373 @@
+import os, copy, json, queue, logging, threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+
+class DeferredFlushMixin:
+    """
+        Skip the flush after every record while `defer_flush` is set,
+        the QueueListener flushes once per batch with `flush_batch`.
+    """
+    defer_flush = False
+
+    def flush(self):
+        if self.defer_flush:
+            return
+        super().flush()
+
+    def flush_batch(self):
+        self.acquire()
+        try:
+            if self.stream and hasattr(self.stream, 'flush'):
+                self.stream.flush()
+        finally:
+            self.release()
+
+
+class BatchTimedRotatingFileHandler(DeferredFlushMixin, TimedRotatingFileHandler):
+    pass
+
+
+class BatchStreamHandler(DeferredFlushMixin, logging.StreamHandler):
+    pass
+
+
+class JsonFormatter(logging.Formatter):
+    """
+        One JSON object per record, serialized by orjson when installed, json otherwise.
+        每筆紀錄輸出一行 JSON, 例外與 extra 欄位各自成為獨立的鍵.
+
+        {"time": "2020-01-01T00:00:00.000", "level": "ERROR", "logger": "root", "message": "...",
+         "module": "...", "func": "...", "line": 1, "thread": "MainThread",
+         "exc_type": "ValueError", "traceback": "Traceback ...", <extra fields>}
+    """
+    _RESERVED = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def __init__(self):
+        super().__init__()
+        self._dumps = self._get_dumps()
+
+    @staticmethod
+    def _get_dumps():
+        try:
+            import orjson
+        except ImportError:
+            return lambda data: json.dumps(data, default=str, ensure_ascii=False, separators=(',', ':'))
+        option = orjson.OPT_NON_STR_KEYS
+        return lambda data: orjson.dumps(data, default=str, option=option).decode()
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'func': record.funcName,
+            'line': record.lineno,
+            'thread': record.threadName,
+        }
+        if record.exc_info and record.exc_info[0] is not None:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+            data['exc_type'] = record.exc_info[0].__name__
+            data['traceback'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+        for key, value in record.__dict__.items():
+            if key not in self._RESERVED and not key.startswith('_'):
+                data[key] = value
+        return self._dumps(data)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """
+        Plain text formatter of the structured mode, the `error` field of a record
+        is shown after the message like in the text mode: [message] [error].
+    """
+
+    def formatMessage(self, record):
+        error = getattr(record, 'error', None)
+        if error is None or error == record.message:
+            return super().formatMessage(record)
+        message = record.message
+        record.message = f'{message}] [{error}'
+        try:
+            return super().formatMessage(record)
+        finally:
+            record.message = message
+
+
+class SizedTimedRotatingFileHandler(DeferredFlushMixin, TimedRotatingFileHandler):
+    """
+        SizedTimedRotatingFileHandler(filename, when='H', interval=1, max_bytes=64MB, backup_count=0,
+            retention_bytes=1GB, compress=True)
+
+        Rotate every `interval` or once the file reaches `max_bytes`, whichever comes first,
+        gzip the rotated segment in a background thread and delete the oldest segments
+        beyond `backup_count` files or `retention_bytes` on disk.
+        依時間或大小輪替, 背景壓縮舊檔, 並限制保留數量與總容量.
+
+        :max_bytes: checked after each write, a file may exceed it by one record, 0 to rotate on time only.
+        :backup_count: rotated segments kept, 0 for no limit.
+        :retention_bytes: total size of rotated segments kept, 0 for no limit.
+    """
+
+    def __init__(self, filename, when='H', interval=1, max_bytes=64 * 1024 ** 2, backup_count=0,
+            retention_bytes=1024 ** 3, compress=True, encoding='utf-8'):
+        # retention replaces the backupCount cleanup of TimedRotatingFileHandler
+        super().__init__(filename, when=when, interval=interval, backupCount=0, encoding=encoding)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.retention_bytes = retention_bytes
+        self._retention_lock = threading.Lock()
+        self._executor = None
+        if compress:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='log_compress')
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return 1
+        if self.max_bytes > 0 and self.stream is not None and self.stream.tell() >= self.max_bytes:
+            return 1
+        return 0
+
+    def rotation_filename(self, default_name):
+        """
+            Several size rotations may share a period, number them instead of overwriting.
+        """
+        name = super().rotation_filename(default_name)
+        base_name = name
+        index = 0
+        while os.path.exists(name) or os.path.exists(f'{name}.gz'):
+            index += 1
+            name = f'{base_name}.{index}'
+        return name
+
+    def rotate(self, source, dest):
+        super().rotate(source, dest)
+        if self._executor is None:
+            self._enforce_retention()
+            return
+        self._executor.submit(self._compress, dest)
+
+    def _compress(self, pathname):
+        import gzip, shutil
+        temp_pathname = f'{pathname}.gz.tmp'
+        with open(pathname, 'rb') as fr, gzip.open(temp_pathname, 'wb') as fw:
+            shutil.copyfileobj(fr, fw)
+        os.replace(temp_pathname, f'{pathname}.gz')
+        os.remove(pathname)
+        self._enforce_retention()
+
+    def get_segments(self):
+        """
+            Rotated segments, newest first.
+        """
+        directory, base_name = os.path.split(self.baseFilename)
+        prefix = f'{base_name}.'
+        segments = list()
+        for file_name in os.listdir(directory):
+            if not file_name.startswith(prefix) or file_name.endswith('.tmp'):
+                continue
+            pathname = os.path.join(directory, file_name)
+            try:
+                stat = os.stat(pathname)
+            except FileNotFoundError:
+                continue
+            segments.append((stat.st_mtime, stat.st_size, pathname))
+        segments.sort(reverse=True)
+        return segments
+
+    def _enforce_retention(self):
+        if not self.backup_count and not self.retention_bytes:
+            return
+        with self._retention_lock:
+            total = 0
+            for index, (_, size, pathname) in enumerate(self.get_segments()):
+                total += size
+                if (self.backup_count and index >= self.backup_count) or \
+                        (self.retention_bytes and total > self.retention_bytes):
+                    try:
+                        os.remove(pathname)
+                    except FileNotFoundError:
+                        pass
+
+    def close(self):
+        super().close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+        BoundedQueueHandler(queue_, overflow='block', sample_every=10, keep_level=logging.ERROR)
+
+        Put records on a bounded queue for a BatchQueueListener, the caller only merges the message,
+        formatting and writing happen on the listener thread.
+        寫入有上限的佇列, 由背景執行緒負責格式化與寫檔.
+
+        :overflow: what to do when the queue is full,
+            'block': wait for room.
+            'drop_oldest': drop the oldest queued record to make room.
+            'sample': keep one record out of `sample_every` (waiting for room), drop the others.
+        :keep_level: records at or above this level always wait for room.
+    """
+    OVERFLOWS = ('block', 'drop_oldest', 'sample')
+
+    def __init__(self, queue_, overflow='block', sample_every=10, keep_level=logging.ERROR):
+        if overflow not in self.OVERFLOWS:
+            raise Exception(f'[{"ERROR":10}]| Invalid overflow policy: {overflow}, choose from {self.OVERFLOWS}')
+        super().__init__(queue_)
+        self.overflow = overflow
+        self.sample_every = sample_every
+        self.keep_level = keep_level
+
+        self._lock = threading.Lock()
+        self._overflow_count = 0
+        self.enqueued = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    _PLAIN = (str, int, float, bool, type(None))
+
+    @classmethod
+    def _snapshot(cls, value):
+        """
+            Copy of an `extra` value as the JSON formatter would write it, containers are walked,
+            other objects turned into str() here while they still hold the logged state.
+        """
+        if isinstance(value, cls._PLAIN):
+            return value
+        if isinstance(value, dict):
+            return {key: cls._snapshot(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [cls._snapshot(item) for item in value]
+        return str(value)
+
+    def prepare(self, record):
+        """
+            Merge `msg % args` and snapshot the `extra` values in the caller like QueueHandler.prepare,
+            the arguments may change or belong to this thread only (e.g. ORM objects),
+            the listener only formats the line and writes it.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        for key, value in record.__dict__.items():
+            if key not in JsonFormatter._RESERVED and not key.startswith('_') and not isinstance(value, self._PLAIN):
+                record.__dict__[key] = self._snapshot(value)
+        return record
+
+    def _drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def _put_drop_oldest(self, record):
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                pass
+            try:
+                oldest = self.queue.get_nowait()
+            except queue.Empty:
+                continue
+            if oldest is BatchQueueListener._sentinel:
+                # the listener is stopping, keep its sentinel and drop this record instead
+                self.queue.put(oldest)
+                self._drop()
+                return
+            self._drop()
+
+    def _put_sample(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        with self._lock:
+            self._overflow_count += 1
+            keep = self._overflow_count % self.sample_every == 0
+        if keep:
+            self.queue.put(record)
+        else:
+            self._drop()
+
+    def enqueue(self, record):
+        if self.overflow == 'block' or record.levelno >= self.keep_level:
+            self.queue.put(record)
+        elif self.overflow == 'drop_oldest':
+            self._put_drop_oldest(record)
+        else:
+            self._put_sample(record)
+        depth = self.queue.qsize()
+        with self._lock:
+            self.enqueued += 1
+            if depth > self.max_depth:
+                self.max_depth = depth
+
+    def get_metrics(self):
+        return {
+            'queue_depth': self.queue.qsize(),
+            'queue_max_depth': self.max_depth,
+            'queue_size': self.queue.maxsize,
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+        }
+
+
+class BatchQueueListener(QueueListener):
+    """
+        BatchQueueListener(queue_, *handlers, batch_size=256)
+
+        Drain up to `batch_size` records per wake-up and flush every handler once per batch.
+    """
+
+    def __init__(self, queue_, *handlers, batch_size=256):
+        super().__init__(queue_, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size
+        for handler in self.handlers:
+            if isinstance(handler, DeferredFlushMixin):
+                handler.defer_flush = True
+
+    def enqueue_sentinel(self):
+        # wait for room, the queue may be full
+        self.queue.put(self._sentinel)
+
+    def _flush(self):
+        for handler in self.handlers:
+            if isinstance(handler, DeferredFlushMixin):
+                handler.flush_batch()
+            else:
+                handler.flush()
+
+    def _monitor(self):
+        q = self.queue
+        has_task_done = hasattr(q, 'task_done')
+        while True:
+            batch = [self.dequeue(True)]
+            while len(batch) < self.batch_size and batch[-1] is not self._sentinel:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+            stop = False
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                else:
+                    self.handle(record)
+                if has_task_done:
+                    q.task_done()
+            self._flush()
+            if stop:
+                break
+
+    def stop(self):
+        super().stop()
+        for handler in self.handlers:
+            if isinstance(handler, DeferredFlushMixin):
+                handler.defer_flush = False
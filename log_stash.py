@@ -1,6 +1,23 @@
-import sys, os, traceback, logging
-from logging.handlers import TimedRotatingFileHandler
-from config import Config
+import sys, os, queue, atexit, logging, threading, traceback
+# logging.handlers and scraping_tools.log_handlers are imported by the handler factories, on start
+
+
+class _LazyTraceback:
+    """
+        Capture the current exception now, format its traceback only when the record is emitted,
+        once for all the handlers.
+    """
+    __slots__ = ('exc_info', '_text')
+
+    def __init__(self):
+        self.exc_info = sys.exc_info()
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            self._text = ''.join(traceback.format_exception(*self.exc_info)).strip('\n')
+            self.exc_info = None
+        return self._text
 
 
 # logged messages to help debug
@@ -21,12 +38,36 @@ class LogStash:
                 DebugTool.debug(e)
                 DebugTool.debug(msg='occur IOError exception')
                 DebugTool.debug(e, msg='occur IOError exception')
+                DebugTool.debug(None, 'fetched %s rows from %s', count, url)
+                DebugTool.debug(msg=lambda: expensive_summary())
+                DebugTool.info(None, 'page done', extra={'url': url, 'rows': count})
+
+            %-style args and callables are only formatted when the level is enabled,
+            tracebacks are captured but only formatted when a handler emits them.
 
         * title: 設定日誌檔名開頭名稱
         * do_print: 是否print在terminal上
         * log_methods: 設定欲新建的日誌名稱和屬性
+        * level: 最低紀錄層級, 低於此層級的呼叫幾乎沒有成本 (Config.LOG_LEVEL)
+        * use_queue: 背景執行緒寫入, 呼叫端只把紀錄放進佇列 (Config.LOG_USE_QUEUE)
+        * queue_size: 佇列上限 (Config.LOG_QUEUE_SIZE)
+        * overflow: 佇列滿時 'block', 'drop_oldest' 或 'sample' (Config.LOG_QUEUE_OVERFLOW)
+        * batch_size: 背景執行緒每批處理筆數, 每批 flush 一次
+        * structured: 檔案改寫成每行一筆 JSON (<title>.<name>.jsonl), 例外與 extra 為獨立欄位 (Config.LOG_STRUCTURED)
+        * max_bytes: structured 模式下單檔上限, 超過即輪替 (Config.LOG_MAX_BYTES)
+        * retention_bytes: structured 模式下輪替檔總容量上限, 輪替檔於背景 gzip (Config.LOG_RETENTION_BYTES)
+
+        Queue mode:
+            LogStash.stop_logging()
+            LogStash.use_queue = True
+            LogStash.start_logging()
+            LogStash.get_metrics()  -> {'queue_depth': 0, 'dropped': 0, ...}
+
+        Importing has no side effect, logging starts on the first call or with
+            LogStash.init(do_print=False, level=logging.INFO)
+        `config.Config` is read once at start, when it exists, attributes changed on the class before are kept.
     """
-    title = getattr(Config, 'SYSTEM_NAME', 'default_log')
+    title = 'default_log'
     do_print = True
     log_methods = {
         'debug': ['/log/debug_log/', logging.DEBUG],
@@ -35,6 +76,56 @@ class LogStash:
     }
     abs_path = os.path.abspath('.')
     logger = None
+    level = logging.DEBUG
+    use_queue = False
+    queue_size = 10000
+    overflow = 'block'
+    batch_size = 256
+    structured = False
+    max_bytes = 64 * 1024 ** 2
+    retention_bytes = 1024 ** 3
+    handlers = list()
+    queue_handler = None
+    listener = None
+
+    _CONFIG_KEYS = {
+        'title': 'SYSTEM_NAME',
+        'level': 'LOG_LEVEL',
+        'use_queue': 'LOG_USE_QUEUE',
+        'queue_size': 'LOG_QUEUE_SIZE',
+        'overflow': 'LOG_QUEUE_OVERFLOW',
+        'structured': 'LOG_STRUCTURED',
+        'max_bytes': 'LOG_MAX_BYTES',
+        'retention_bytes': 'LOG_RETENTION_BYTES',
+    }
+    _defaults = dict()
+    _config_loaded = False
+    # the first calls of several threads may start logging at once
+    _start_lock = threading.RLock()
+
+    @classmethod
+    def _load_config(cls):
+        if cls._config_loaded:
+            return
+        cls._config_loaded = True
+        try:
+            from config import Config
+        except ImportError:
+            return
+        for name, key in cls._CONFIG_KEYS.items():
+            if hasattr(Config, key) and getattr(cls, name) == cls._defaults.get(name):
+                setattr(cls, name, getattr(Config, key))
+
+    @classmethod
+    def init(cls, **kwargs):
+        """
+            Start logging now, `kwargs` override the class attributes and the config.
+        """
+        with cls._start_lock:
+            cls._load_config()
+            for name, value in kwargs.items():
+                setattr(cls, name, value)
+            cls.start_logging()
 
     @classmethod
     def _init_file_path(cls):
@@ -43,25 +134,44 @@ class LogStash:
             os.makedirs(f'{cls.abs_path}{path}', exist_ok=True)
 
     @staticmethod
-    def _get_file_handler(file_name, level=logging.DEBUG):
+    def _get_file_handler(file_name, level=logging.DEBUG, batch=False):
         """
             log存成檔案
         """
-        console = TimedRotatingFileHandler(
+        from logging.handlers import TimedRotatingFileHandler
+        from scraping_tools.log_handlers import BatchTimedRotatingFileHandler
+        handler_class = BatchTimedRotatingFileHandler if batch else TimedRotatingFileHandler
+        console = handler_class(
             file_name, when='H', interval=1, backupCount=10000, encoding=None, delay=False, utc=False)
         console.setLevel(level)
         formatter = logging.Formatter('[%(asctime)-s] [%(levelname)-8s] [%(message)s]')
         console.setFormatter(formatter)
         return console
 
+    @classmethod
+    def _get_structured_file_handler(cls, file_name, level=logging.DEBUG):
+        """
+            log存成 JSON lines, 依時間與大小輪替
+        """
+        from scraping_tools.log_handlers import JsonFormatter, SizedTimedRotatingFileHandler
+        console = SizedTimedRotatingFileHandler(
+            file_name, when='H', interval=1, max_bytes=cls.max_bytes, retention_bytes=cls.retention_bytes)
+        console.setLevel(level)
+        console.setFormatter(JsonFormatter())
+        return console
+
     @staticmethod
-    def _get_stream_handler(level=logging.DEBUG):
+    def _get_stream_handler(level=logging.DEBUG, batch=False, structured=False):
         """
             print到終端上的
+            :structured: show the `error` field of structured records after the message
         """
-        console = logging.StreamHandler(sys.stdout)
+        from scraping_tools.log_handlers import BatchStreamHandler, ConsoleFormatter
+        handler_class = BatchStreamHandler if batch else logging.StreamHandler
+        console = handler_class(sys.stdout)
         console.setLevel(level)
-        formatter = logging.Formatter('[%(asctime)s] [%(levelname)-8s] [%(message)s]')
+        formatter_class = ConsoleFormatter if structured else logging.Formatter
+        formatter = formatter_class('[%(asctime)s] [%(levelname)-8s] [%(message)s]')
         console.setFormatter(formatter)
         return console
 
@@ -84,62 +194,183 @@ class LogStash:
     @classmethod
     def _get_logger(cls):
         logger = logging.getLogger()
-        logger.setLevel(logging.DEBUG)
+        logger.setLevel(cls.level)
         cls.logger = logger
 
+    @classmethod
+    def set_level(cls, level):
+        """
+            level: logging.INFO or 'INFO'
+        """
+        cls.level = level
+        if cls.logger is not None:
+            cls.logger.setLevel(level)
+
     @staticmethod
-    def _have_traceback(method, exception, msg):
-        traceback_result = traceback.format_exc().strip('\n')
+    def _have_traceback(method, exception, msg, args=(), extra=None):
+        traceback_result = _LazyTraceback()
+        if callable(msg):
+            msg = msg()
         if exception and msg:
-            method(f'{msg}] [{str(exception)}]\n[{traceback_result}')
+            if args:
+                method(f'{msg}] [%s]\n[%s', *args, exception, traceback_result, extra=extra)
+            else:
+                method('%s] [%s]\n[%s', msg, exception, traceback_result, extra=extra)
         elif exception:
-            method(f'{str(exception)}]\n[{traceback_result}')
+            method('%s]\n[%s', exception, traceback_result, extra=extra)
         elif msg:
-            method(f'{msg}]\n[{traceback_result}')
+            if args:
+                method(f'{msg}]\n[%s', *args, traceback_result, extra=extra)
+            else:
+                method('%s]\n[%s', msg, traceback_result, extra=extra)
 
     @staticmethod
-    def _no_traceback(method, exception, msg):
+    def _no_traceback(method, exception, msg, args=(), extra=None):
+        if callable(msg):
+            msg = msg()
         if exception and msg:
-            method(f'{msg}] [{str(exception)}')
+            if args:
+                method(f'{msg}] [%s', *args, exception, extra=extra)
+            else:
+                method('%s] [%s', msg, exception, extra=extra)
         elif exception:
-            method(exception)
+            method(exception, extra=extra)
         elif msg:
-            method(msg)
+            method(msg, *args, extra=extra)
+
+    @staticmethod
+    def _structured_log(method, exception, msg, args=(), extra=None, with_traceback=False):
+        """
+            The exception goes to the `error` key and the traceback to `traceback`, the message stays plain,
+            the console shows the error after the message.
+        """
+        if callable(msg):
+            msg = msg()
+        extra = dict(extra) if extra else dict()
+        if exception is not None:
+            extra['error'] = str(exception)
+        exc_info = sys.exc_info() if with_traceback else None
+        if exc_info and exc_info[0] is None:
+            exc_info = None
+        # module, func and line of the caller of LogStash.<method>, not of this helper
+        if msg:
+            method(msg, *args, exc_info=exc_info, extra=extra, stacklevel=4)
+        else:
+            method('%s', exception, exc_info=exc_info, extra=extra, stacklevel=4)
+
+    @classmethod
+    def _log(cls, method, exception, msg, args, extra, with_traceback=False):
+        if cls.structured:
+            cls._structured_log(method, exception, msg, args=args, extra=extra, with_traceback=with_traceback)
+        elif with_traceback:
+            cls._have_traceback(method=method, exception=exception, msg=msg, args=args, extra=extra)
+        else:
+            cls._no_traceback(method=method, exception=exception, msg=msg, args=args, extra=extra)
+
+    @classmethod
+    def _start_queue(cls, console_list):
+        """
+            Hand the handlers to a background listener, only the queue handler stays on the root logger.
+        """
+        queue_ = queue.Queue(maxsize=cls.queue_size)
+        from scraping_tools.log_handlers import BatchQueueListener, BoundedQueueHandler
+        cls.queue_handler = BoundedQueueHandler(queue_, overflow=cls.overflow)
+        cls.listener = BatchQueueListener(queue_, *console_list, batch_size=cls.batch_size)
+        cls.listener.start()
+        atexit.register(cls.stop_logging)
+        return [cls.queue_handler]
 
     @classmethod
     def start_logging(cls):
-        cls._init_file_path()
-        console_list = []
-        if cls.do_print:
-            stream_handler = cls._get_stream_handler()
-            console_list.append(stream_handler)
-        for key, value in cls.log_methods.items():
-            file_handler = cls._get_file_handler(
-                file_name=f'{cls.abs_path}{value[0]}{cls.title}.{key}.log', level=value[1])
-            console_list.append(file_handler)
-        cls._set_loggers(console_list=console_list)
-        cls._remove_info()
-        cls._get_logger()
+        if cls.logger is not None:
+            return
+        with cls._start_lock:
+            if cls.logger is not None:
+                return
+            cls._load_config()
+            cls._init_file_path()
+            console_list = []
+            if cls.do_print:
+                stream_handler = cls._get_stream_handler(batch=cls.use_queue, structured=cls.structured)
+                console_list.append(stream_handler)
+            for key, value in cls.log_methods.items():
+                if cls.structured:
+                    file_handler = cls._get_structured_file_handler(
+                        file_name=f'{cls.abs_path}{value[0]}{cls.title}.{key}.jsonl', level=value[1])
+                else:
+                    file_handler = cls._get_file_handler(
+                        file_name=f'{cls.abs_path}{value[0]}{cls.title}.{key}.log', level=value[1], batch=cls.use_queue)
+                console_list.append(file_handler)
+            cls.handlers = console_list
+            if cls.use_queue:
+                console_list = cls._start_queue(console_list=console_list)
+            cls._set_loggers(console_list=console_list)
+            cls._remove_info()
+            cls._get_logger()
+
+    @classmethod
+    def stop_logging(cls):
+        """
+            Flush what is queued, detach and close every handler.
+        """
+        with cls._start_lock:
+            root = logging.getLogger()
+            if cls.queue_handler is not None:
+                root.removeHandler(cls.queue_handler)
+                cls.queue_handler = None
+            if cls.listener is not None:
+                cls.listener.stop()
+                cls.listener = None
+                atexit.unregister(cls.stop_logging)
+            for handler in cls.handlers:
+                root.removeHandler(handler)
+                handler.close()
+            cls.handlers = list()
+            cls.logger = None
+
+    @classmethod
+    def get_metrics(cls):
+        """
+            Queue depth and dropped records of the queue mode, empty without it.
+        """
+        if cls.queue_handler is None:
+            return dict()
+        return cls.queue_handler.get_metrics()
 
     @classmethod
-    def debug(cls, exception=None, msg=None):
-        cls._no_traceback(method=cls.logger.debug, exception=exception, msg=msg)
+    def debug(cls, exception=None, msg=None, *args, extra=None):
+        if cls.logger is None:
+            cls.start_logging()
+        if cls.logger.isEnabledFor(logging.DEBUG):
+            cls._log(cls.logger.debug, exception, msg, args, extra)
 
     @classmethod
-    def info(cls, exception=None, msg=None):
-        cls._no_traceback(method=cls.logger.info, exception=exception, msg=msg)
+    def info(cls, exception=None, msg=None, *args, extra=None):
+        if cls.logger is None:
+            cls.start_logging()
+        if cls.logger.isEnabledFor(logging.INFO):
+            cls._log(cls.logger.info, exception, msg, args, extra)
 
     @classmethod
-    def warning(cls, exception=None, msg=None):
-        cls._no_traceback(method=cls.logger.warning, exception=exception, msg=msg)
+    def warning(cls, exception=None, msg=None, *args, extra=None):
+        if cls.logger is None:
+            cls.start_logging()
+        if cls.logger.isEnabledFor(logging.WARNING):
+            cls._log(cls.logger.warning, exception, msg, args, extra)
 
     @classmethod
-    def error(cls, exception=None, msg=None):
-        cls._have_traceback(method=cls.logger.error, exception=exception, msg=msg)
+    def error(cls, exception=None, msg=None, *args, extra=None):
+        if cls.logger is None:
+            cls.start_logging()
+        if cls.logger.isEnabledFor(logging.ERROR):
+            cls._log(cls.logger.error, exception, msg, args, extra, with_traceback=True)
 
     @classmethod
-    def critical(cls, exception=None, msg=None):
-        cls._have_traceback(method=cls.logger.critical, exception=exception, msg=msg)
+    def critical(cls, exception=None, msg=None, *args, extra=None):
+        if cls.logger is None:
+            cls.start_logging()
+        if cls.logger.isEnabledFor(logging.CRITICAL):
+            cls._log(cls.logger.critical, exception, msg, args, extra, with_traceback=True)
 
 
-LogStash.start_logging()
+LogStash._defaults = {name: getattr(LogStash, name) for name in LogStash._CONFIG_KEYS}
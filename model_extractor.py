@@ -1,5 +1,5 @@
-import inspect
-from flask_sqlalchemy import DefaultMeta
+from scraping_tools.keyset_reader import KeysetReader
+from scraping_tools.model_registry import ModelRegistry
 
 
 class ModelExtractor:
@@ -27,21 +27,36 @@ class ModelExtractor:
             'column_N': value_N,
         }
     ]
+    With `split_by` greater than 1, the dicts are grouped into lists of `split_by` dicts.
+
+    Lazy usage, nothing is read until iterated, one page in memory at a time:
+        extractor = ModelExtractor(table=MyModel, split_by=500, lazy=True)
+        extractor.count()
+        for row in extractor.iter_rows():
+            ...
+        for chunk in extractor.iter_chunks():
+            ...
+
+    Process pool usage, chunks are read while the workers transform the previous ones:
+        for result in extractor.map_chunks(transform=normalize, workers=4):
+            ...
     """
 
-    def __init__(self, table, slice_num=2000, split_by=0):
+    def __init__(self, table, slice_num=2000, split_by=0, projected=False, lazy=False):
 
         self.table = table
         self.slice_num = slice_num
         self.split_by = split_by
+        self.projected = projected
 
         self.objects = None
-        self.columns = list()
+        self.columns = self._get_columns()
         self.data = list()
+        self.quantity = None
 
-        self._run()
-
-        self.quantity = len(self.objects)
+        if not lazy:
+            self._run()
+            self.quantity = len(self.objects)
 
     @staticmethod
     def get_tables(models):
@@ -59,7 +74,7 @@ class ModelExtractor:
             ModelNameN: <class 'ModelNameN'>,
         }
         """
-        return {_.__name__: _ for name, _ in inspect.getmembers(models) if isinstance(_, DefaultMeta)}
+        return ModelRegistry.get_models(models=models)
 
     def _get_columns(self):
         """
@@ -67,39 +82,82 @@ class ModelExtractor:
         取得全部"表單物件"鍵值,排除非"欄位名稱",回傳列表.
         return ['column_1', 'column_2', ..., 'column_N']
         """
-        results = list()
-        for key, value in self.table.__dict__.items():
-            if key.startswith('_'):
-                continue
-            comparator = value.__dict__.get('comparator')
-            if comparator is None:
-                continue
-            data_type = comparator.__dict__.get('type')
-            if data_type is None:
-                continue
-            python_data_type = getattr(data_type, 'python_type')
-            if python_data_type:
-                results.append(key)
-        return results
+        return list(ModelRegistry.get(model=self.table).columns)
+
+    def _get_reader(self):
+        columns = self.columns if self.projected else None
+        return KeysetReader(table=self.table, slice_length=self.slice_num, columns=columns)
 
     def _slice_query(self):
         """
-        Slice query for entire table,
+        Slice query for entire table by primary key (keyset pagination),
         It will just return the same result as query.all() but safely for memory cache.
         回傳值等同 query.all(), 但能確保在低記憶體主機上安全執行.
+        With `projected`, only the columns are selected through SQLAlchemy Core as tuples.
         """
-        count = 0
-        results = list()
-        while True:
-            start = self.slice_num * count
-            end = self.slice_num * (count + 1)
-            slice_cache = self.table.query.slice(start, end).all()
-            if slice_cache:
-                results.extend(slice_cache)
-            if len(slice_cache) < self.slice_num:
-                break
-            count += 1
-        return results
+        return list(self._get_reader())
+
+    def _to_dict(self, obj):
+        if self.projected:
+            return dict(zip(self.columns, obj))
+        return {column: getattr(obj, column) for column in self.columns}
+
+    @staticmethod
+    def _iter_buckets(rows, size):
+        bucket = list()
+        for row in rows:
+            bucket.append(row)
+            if len(bucket) >= size:
+                yield bucket
+                bucket = list()
+        if bucket:
+            yield bucket
+
+    def count(self):
+        """
+        Count rows in the database without loading them.
+        """
+        if self.objects is not None:
+            return len(self.objects)
+        return self._get_reader().count()
+
+    def iter_rows(self):
+        """
+        Yield one dict per row, page by page.
+        逐筆產出字典, 記憶體僅保留一頁.
+        """
+        if self.objects is not None:
+            for obj in self.objects:
+                yield self._to_dict(obj)
+            return
+        for page in self._get_reader().iter_pages():
+            for obj in page:
+                yield self._to_dict(obj)
+
+    def iter_chunks(self, size=None):
+        """
+        Yield lists of `size` dicts, default to `split_by`.
+        """
+        size = size or self.split_by
+        if not size or size < 1:
+            raise Exception(f'[{"ERROR":10}]| Invalid chunk size: {size}')
+        return self._iter_buckets(rows=self.iter_rows(), size=size)
+
+    def map_chunks(self, transform, size=None, workers=None, max_in_flight=None, ordered=True, **pool_kwargs):
+        """
+        Yield `transform(chunk)` of every chunk of `size` dicts (default to `split_by`) computed on a process pool,
+        at most `max_in_flight` chunks are read ahead of the results, see ChunkPool.
+        `transform` runs in other processes, it must be a module level function and not use the session.
+        以多行程轉換每個區塊, 讀取資料庫與轉換同時進行.
+        """
+        from scraping_tools.chunk_pool import ChunkPool
+        with ChunkPool(
+                transform=transform, workers=workers, max_in_flight=max_in_flight, ordered=ordered,
+                **pool_kwargs) as pool:
+            yield from pool.map(self.iter_chunks(size=size))
+
+    def __iter__(self):
+        return self.iter_rows()
 
     def _split_objects(self):
         """
@@ -108,25 +166,13 @@ class ModelExtractor:
         | |___bucket____| |___bucket____| |___bucket____| |
         |_____________________container___________________|
         """
-        container = list()
-        bucket = list()
-        for index, obj in enumerate(self.objects, start=1):
-            result = {column: getattr(obj, column) for column in self.columns}
-            bucket.append(result)
-            if index % self.split_by == 0 and bucket:
-                container.append(bucket)
-                bucket = list()
-        if bucket:
-            container.append(bucket)
-        return container
+        return list(self.iter_chunks(size=self.split_by))
 
     def _get_data(self):
-        if split_by > 1:
-            self._split_objects()
-        return [{column: getattr(obj, column) for column in self.columns} for obj in self.objects]
+        if self.split_by > 1:
+            return self._split_objects()
+        return list(self.iter_rows())
 
-    @classmethod
     def _run(self):
-        self.columns = self._get_columns()
         self.objects = self._slice_query()
         self.data = self._get_data()
@@ -0,0 +1,124 @@
+# built-in
+import threading
+from collections import namedtuple
+# submodule
+from scraping_tools.utils import Utils
+
+
+ModelMeta = namedtuple('ModelMeta', [
+    'name',                 # 'MyModelName'
+    'model',                # <class 'MyModelName'>
+    'file_name',            # 'my_model_name', 'HTTPLog' -> 'h_t_t_p_log' as in earlier backups
+    'columns',              # ['column_1', ..., 'column_N'], attribute names
+    'column_types',         # {'column_1': SQLAlchemy type, ...}
+    'python_types',         # {'column_1': int, ...}, None when the type has no python_type
+    'column_keys',          # {'column_1': Column.key, ...}, keys of table.insert()
+    'column_names',         # {'column_1': Column.name, ...}, names in the database
+    'primary_key',          # ['id'], attribute names
+    'primary_key_columns',  # [Column('id', ...)]
+])
+
+
+class ModelRegistry:
+    """
+        Cached metadata of flask_sqlalchemy models, built once from the mapper and `__table__`.
+        模型欄位資訊快取, 所有擷取工具共用, 避免重複反射.
+
+        How to use:
+            meta = ModelRegistry.get(MyModelName)
+            meta.columns        -> ['id', 'name', ...]
+            meta.primary_key    -> ['id']
+            meta.file_name      -> 'my_model_name'
+            ModelRegistry.get_models(models)  -> {'MyModelName': <class 'MyModelName'>, ...}
+            ModelRegistry.invalidate()        -> drop every cached entry after models changed
+    """
+    _lock = threading.RLock()
+    _metas = dict()
+    _models = dict()
+
+    @staticmethod
+    def _get_python_type(column_type):
+        try:
+            return column_type.python_type
+        except NotImplementedError:
+            return None
+
+    @classmethod
+    def _build(cls, model):
+        from sqlalchemy import inspect as sa_inspect
+        mapper = sa_inspect(model)
+        column_types = dict()
+        column_keys = dict()
+        column_names = dict()
+        for prop in mapper.column_attrs:
+            if prop.key.startswith('_'):
+                continue
+            column = prop.columns[0]
+            column_types[prop.key] = column.type
+            column_keys[prop.key] = column.key
+            column_names[prop.key] = column.name
+        primary_key_columns = list(mapper.primary_key)
+        return ModelMeta(
+            name=model.__name__,
+            model=model,
+            file_name=Utils.camel_to_file_name(letters=model.__name__),
+            columns=list(column_types),
+            column_types=column_types,
+            python_types={name: cls._get_python_type(column_type) for name, column_type in column_types.items()},
+            column_keys=column_keys,
+            column_names=column_names,
+            primary_key=[mapper.get_property_by_column(column).key for column in primary_key_columns],
+            primary_key_columns=primary_key_columns,
+        )
+
+    @classmethod
+    def get(cls, model):
+        meta = cls._metas.get(model)
+        if meta is not None:
+            return meta
+        with cls._lock:
+            meta = cls._metas.get(model)
+            if meta is None:
+                meta = cls._build(model=model)
+                cls._metas[model] = meta
+        return meta
+
+    @classmethod
+    def get_models(cls, models):
+        """
+            Parse all members of `models` and keep "flask_sqlalchemy.model.DefaultMeta" instances.
+            return {
+                ModelName1: <class 'ModelName1'>,
+                ...
+            }
+        """
+        cached = cls._models.get(id(models))
+        if cached is not None and cached[0] is models:
+            return dict(cached[1])
+        # flask_sqlalchemy (and flask) are only imported once models are inspected
+        import inspect
+        from flask_sqlalchemy import DefaultMeta
+        tables = {_.__name__: _ for name, _ in inspect.getmembers(models) if isinstance(_, DefaultMeta)}
+        with cls._lock:
+            cls._models[id(models)] = (models, tables)
+        return dict(tables)
+
+    @classmethod
+    def get_by_file_name(cls, models, file_name):
+        for model in cls.get_models(models=models).values():
+            if cls.get(model=model).file_name == file_name:
+                return model
+        return None
+
+    @classmethod
+    def invalidate(cls, model=None):
+        """
+            Drop the cached metadata of `model`, or everything when None.
+        """
+        with cls._lock:
+            if model is None:
+                cls._metas.clear()
+                cls._models.clear()
+                return
+            cls._metas.pop(model, None)
+            cls._models.clear()
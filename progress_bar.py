@@ -1,4 +1,4 @@
-import os
+import os, sys, time, threading
 
 
 class ProgressBar:
@@ -85,6 +85,394 @@ class ProgressBar:
         if self.proceed_rate == 100:
             print('')
 
+class LiveProgressBar(ProgressBar):
+    """
+        LiveProgressBar(amount, info=None, desc=None, count=0, max_refresh=10, stream=None,
+            smoothing=0.3, report_every=None, callback=None, log=None)
+
+        A persistent ProgressBar for hot loops, redraw in place at most `max_refresh` times per second
+        and only when the rendered line changed.
+        The console width is read once and refreshed on SIGWINCH.
+        When `stream` is not a TTY nothing is written, use `report_every` with `log` or `callback` for a summary.
+        長時間迴圈用的進度條, 限制重繪頻率, 非終端機時不輸出.
+
+        The line shows the smoothed rate, elapsed time and ETA, plus bytes/sec when `update` is given `nbytes`.
+        顯示平滑後的速率、已耗時與預估剩餘時間.
+
+        :smoothing: weight of the latest sample in the exponential moving average of the rates.
+        :report_every: seconds between reports to `callback` and `log`, also reported once at `close`,
+            works without a terminal (cron, containers).
+        :callback: called with the `get_stats()` dict.
+        :log: called with a one line summary, e.g. `logging.getLogger().info` or `lambda line: LogStash.info(msg=line)`.
+
+        How to use:
+            with LiveProgressBar(amount=total, info='EXPORT >>', desc='my_table') as bar:
+                for batch in batches:
+                    ...
+                    bar.update(len(batch), nbytes=size)
+    """
+    _console_width = None
+    _sigwinch_installed = False
+    _MIN_SAMPLE = 0.05
+
+    def __init__(self, amount, info=None, desc=None, count=0, max_refresh=10, stream=None,
+            smoothing=0.3, report_every=None, callback=None, log=None):
+        self.count = count
+        self.amount = amount
+        self.info = info
+        self.desc = desc
+        self.stream = stream or sys.stdout
+        self.min_interval = 1 / max_refresh if max_refresh else 0
+        self.smoothing = smoothing
+        self.report_every = report_every if (callback or log) else None
+        self.callback = callback
+        self.log = log
+
+        self.nbytes = 0
+        self.rate = None
+        self.bytes_rate = None
+        self.start_time = time.monotonic()
+        self._sample_time = self.start_time
+        self._sample_count = count
+        self._sample_bytes = 0
+        self._last_report = self.start_time
+
+        self.validate()
+
+        self.proceed_rate = self._get_proceed_rate()
+        self.enabled = self._is_tty(stream=self.stream)
+        self.closed = False
+        self._last_line = None
+        self._last_draw = 0
+
+        if self.enabled:
+            self._install_sigwinch()
+            self._draw(now=time.monotonic())
+
+    @staticmethod
+    def _is_tty(stream):
+        try:
+            return stream.isatty()
+        except (AttributeError, ValueError):
+            return False
+
+    # the width cache and the handler are shared by every subclass, kept on LiveProgressBar itself
+    @staticmethod
+    def _on_sigwinch(previous):
+        def handler(signum, frame):
+            LiveProgressBar._console_width = None
+            if callable(previous):
+                previous(signum, frame)
+        return handler
+
+    @staticmethod
+    def _install_sigwinch():
+        """
+            Signal handlers can only be set from the main thread, other threads keep the cached width.
+        """
+        if LiveProgressBar._sigwinch_installed or threading.current_thread() is not threading.main_thread():
+            return
+        import signal
+        if not hasattr(signal, 'SIGWINCH'):
+            return
+        previous = signal.getsignal(signal.SIGWINCH)
+        signal.signal(signal.SIGWINCH, LiveProgressBar._on_sigwinch(previous=previous))
+        LiveProgressBar._sigwinch_installed = True
+
+    @staticmethod
+    def _get_console_width():
+        if LiveProgressBar._console_width is None:
+            LiveProgressBar._console_width = ProgressBar._get_console_width()
+        return LiveProgressBar._console_width
+
+    @staticmethod
+    def _fmt_seconds(seconds):
+        if seconds is None:
+            return '--:--'
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        if hours:
+            return f'{hours}:{minutes:02}:{seconds:02}'
+        return f'{minutes:02}:{seconds:02}'
+
+    @staticmethod
+    def _fmt_bytes(size):
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if size < 1024:
+                return f'{size:,.1f}{unit}'
+            size /= 1024
+        return f'{size:,.1f}TB'
+
+    def _smooth(self, average, sample):
+        if average is None:
+            return sample
+        return self.smoothing * sample + (1 - self.smoothing) * average
+
+    def _sample(self, now, force=False):
+        """
+            Samples closer than _MIN_SAMPLE seconds are too noisy, except the first one when forced.
+        """
+        elapsed = now - self._sample_time
+        if elapsed <= 0 or (elapsed < self._MIN_SAMPLE and not (force and self.rate is None)):
+            return
+        self.rate = self._smooth(self.rate, (self.count - self._sample_count) / elapsed)
+        if self.nbytes:
+            self.bytes_rate = self._smooth(self.bytes_rate, (self.nbytes - self._sample_bytes) / elapsed)
+        self._sample_time = now
+        self._sample_count = self.count
+        self._sample_bytes = self.nbytes
+
+    def get_stats(self):
+        """
+            return {
+                'info': 'EXPORT >>', 'desc': 'my_table', 'count': 1000, 'amount': 5000, 'percent': 20.0,
+                'elapsed': 2.0, 'rate': 500.0, 'eta': 8.0, 'bytes': 65536, 'bytes_rate': 32768.0,
+            }
+            Rates are items or bytes per second, times are seconds, `rate` and `eta` are None before the first sample.
+        """
+        eta = None
+        if self.rate and self.amount > self.count:
+            eta = (self.amount - self.count) / self.rate
+        elif self.amount <= self.count:
+            eta = 0
+        return {
+            'info': self.info,
+            'desc': self.desc,
+            'count': self.count,
+            'amount': self.amount,
+            'percent': round(self._get_proceed_rate(), 2),
+            'elapsed': time.monotonic() - self.start_time,
+            'rate': self.rate,
+            'eta': eta,
+            'bytes': self.nbytes,
+            'bytes_rate': self.bytes_rate,
+        }
+
+    def _get_formatted_stats(self, stats=None):
+        stats = stats or self.get_stats()
+        rate = f'{stats["rate"]:,.0f}/s' if stats['rate'] is not None else '-/s'
+        if stats['bytes_rate'] is not None:
+            rate = f'{rate} {self._fmt_bytes(stats["bytes_rate"])}/s'
+        return f'{rate} {self._fmt_seconds(stats["elapsed"])}<{self._fmt_seconds(stats["eta"])} '
+
+    def _report(self, now):
+        self._last_report = now
+        stats = self.get_stats()
+        if self.callback is not None:
+            self.callback(stats)
+        if self.log is not None:
+            info = self.info.upper() if self.info else 'INFO'
+            desc = self.desc or ''
+            self.log(f'[{info[:10]:<10}]| {desc} {stats["count"]:,} of {stats["amount"]:,} '
+                f'[{stats["percent"]:>6,.2f}%] {self._get_formatted_stats(stats=stats)}'.rstrip())
+
+    def _render(self):
+        bar = f'{self._get_progress_bar()}{self._get_formatted_stats()}'
+        info = self._get_formatted_info()
+        rate = self._get_formatted_rate()
+        desc = self._get_formatted_desc(desc_length=self._get_desc_length(bar, info, rate))
+        return f'{info}{rate}{bar}{desc}'
+
+    def _draw(self, now):
+        self._last_draw = now
+        self._sample(now=now)
+        self.proceed_rate = self._get_proceed_rate()
+        line = self._render()
+        if line == self._last_line:
+            return
+        self._last_line = line
+        self.stream.write(f'\r{line}')
+        self.stream.flush()
+
+    def update(self, n=1, nbytes=0):
+        self.count += n
+        self.nbytes += nbytes
+        if not self.enabled and self.report_every is None:
+            return
+        now = time.monotonic()
+        if self.report_every is not None and now - self._last_report >= self.report_every:
+            if not self.enabled:
+                self._sample(now=now)
+            self._report(now=now)
+        if self.enabled and now - self._last_draw >= self.min_interval:
+            self._draw(now=now)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.proceed_rate = self._get_proceed_rate()
+        now = time.monotonic()
+        self._sample(now=now, force=True)
+        if self.report_every is not None:
+            self._report(now=now)
+        if self.enabled:
+            self._draw(now=time.monotonic())
+            self.stream.write('\n')
+            self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
+class ProgressCounter:
+    """
+        ProgressCounter(process_safe=False)
+
+        What a worker holds instead of a bar, `update` only adds to a counter under a lock,
+        the MultiProgressBar render thread reads it.
+        工作執行緒/行程只累加計數, 由 MultiProgressBar 統一繪製.
+
+        :process_safe: keep the counts in shared memory, the counter must reach the child process
+            by inheritance (fork, or `initargs` of a process pool), it cannot be pickled into a task.
+    """
+
+    def __init__(self, process_safe=False):
+        if process_safe:
+            import multiprocessing
+            self._values = multiprocessing.Array('q', 2)
+            self._lock = self._values.get_lock()
+        else:
+            self._values = [0, 0]
+            self._lock = threading.Lock()
+
+    def update(self, n=1, nbytes=0):
+        with self._lock:
+            self._values[0] += n
+            self._values[1] += nbytes
+
+    @property
+    def count(self):
+        return self._values[0]
+
+    @property
+    def nbytes(self):
+        return self._values[1]
+
+
+class _GroupBar(LiveProgressBar):
+    """
+        A LiveProgressBar rendered by MultiProgressBar, it never writes by itself.
+    """
+    # the bar units may take two columns, keep a line from wrapping and breaking the block
+    _RESERVED_ROOM = ProgressBar._BAR_LENGTH + 1
+
+    @staticmethod
+    def _is_tty(stream):
+        return False
+
+    def render(self, counter, now, force=False):
+        self.count = counter.count
+        self.nbytes = counter.nbytes
+        self._sample(now=now, force=force)
+        self.proceed_rate = self._get_proceed_rate()
+        return self._render()
+
+
+class MultiProgressBar:
+    """
+        MultiProgressBar(stream=None, refresh=0.2, process_safe=False)
+
+        Own several named bars and draw the running ones as a block from a single render thread,
+        finished bars are printed once above the block.
+        When `stream` is not a TTY there is no render thread, each bar prints one line when finished.
+        多個進度條由單一執行緒統一繪製, 工作端只更新 ProgressCounter.
+
+        How to use:
+            with MultiProgressBar() as progress:
+                counter = progress.add(name='my_table', amount=5000, info='EXPORT >>')
+                executor.submit(work, counter)      # worker: counter.update(len(batch))
+                ...
+                progress.finish(name='my_table')
+    """
+
+    def __init__(self, stream=None, refresh=0.2, process_safe=False):
+        self.stream = stream or sys.stdout
+        self.refresh = refresh
+        self.process_safe = process_safe
+        self.enabled = LiveProgressBar._is_tty(stream=self.stream)
+
+        self._lock = threading.Lock()
+        self._bars = dict()
+        self._finished = list()
+        self._drawn_lines = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+        if self.enabled:
+            LiveProgressBar._install_sigwinch()
+            self._thread = threading.Thread(target=self._loop, name='progress_render', daemon=True)
+            self._thread.start()
+
+    def add(self, name, amount, info=None):
+        """
+            Return the ProgressCounter of a new bar.
+        """
+        counter = ProgressCounter(process_safe=self.process_safe)
+        bar = _GroupBar(amount=amount, info=info, desc=name, max_refresh=0)
+        with self._lock:
+            self._bars[name] = (bar, counter)
+        return counter
+
+    def finish(self, name, amount=None, message=None):
+        """
+            Print the final line of a bar, or `message` instead, and drop it from the block.
+            :amount: the real total, when the bar was created with an estimate.
+        """
+        with self._lock:
+            if name not in self._bars:
+                return
+            bar, counter = self._bars.pop(name)
+            if amount is not None:
+                bar.amount = amount
+            line = message or bar.render(counter=counter, now=time.monotonic(), force=True)
+            if self.enabled:
+                self._finished.append(line)
+                return
+            self.stream.write(f'{line}\n')
+            self.stream.flush()
+
+    def _render(self):
+        now = time.monotonic()
+        with self._lock:
+            lines = self._finished
+            self._finished = list()
+            running = [bar.render(counter=counter, now=now) for bar, counter in self._bars.values()]
+        if not lines and not running and not self._drawn_lines:
+            return
+        output = list()
+        if self._drawn_lines:
+            # back to the first line of the block
+            output.append(f'\x1b[{self._drawn_lines}F')
+        output.extend(f'{line}\x1b[K\n' for line in lines + running)
+        output.append('\x1b[J')
+        self._drawn_lines = len(running)
+        self.stream.write(''.join(output))
+        self.stream.flush()
+
+    def _loop(self):
+        while not self._stop.wait(self.refresh):
+            self._render()
+
+    def close(self):
+        for name in list(self._bars):
+            self.finish(name=name)
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self._render()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
 if __name__ == '__main__':
     import time
     amount = 147
@@ -93,3 +481,19 @@ if __name__ == '__main__':
         desc = f'{demo} | {count} of {amount}'
         ProgressBar(count=count, amount=amount, desc=desc, info='test')
         time.sleep(0.01)
+    with LiveProgressBar(amount=amount * 1000, desc=demo, info='live') as bar:
+        for count in range(amount * 1000):
+            bar.update(1)
+    with MultiProgressBar() as progress:
+        counters = [progress.add(name=f'worker_{index}', amount=amount * 1000, info='multi') for index in range(3)]
+        def work(index):
+            for count in range(amount * 1000):
+                counters[index].update(1)
+                if count % 1000 == 0:
+                    time.sleep(0.001 * (index + 1))
+            progress.finish(name=f'worker_{index}')
+        threads = [threading.Thread(target=work, args=(index,)) for index in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,257 @@
+# built-in
+import os, ast, uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+# 3rd-party
+from sqlalchemy import inspect as sa_inspect, text
+# submodule
+from scraping_tools.backup_formats import BackupFormats
+from scraping_tools.model_registry import ModelRegistry
+from scraping_tools.utils import Utils
+
+
+class RestoreDatabase:
+    """
+        RestoreDatabase(models, backup_path, batch_size=5000, workers=1, use_copy=True)
+
+        Load a directory written by BackupDatabase back into the models,
+        `<table_name>.csv` is mapped to its model by Utils.underscore_to_camel,
+        'NULL' becomes None and every value is parsed back with the python type of its column.
+        將 BackupDatabase 的備份資料夾批次寫回資料庫.
+
+        :backup_path: `<path>/backup_%Y_%m_%dT%H_%M/<models_name>`, CSV formats only.
+        :batch_size: rows per executemany.
+        :workers: tables loaded at once, tables referenced by a foreign key are always loaded first.
+        :use_copy: load plain CSV files with COPY on PostgreSQL (psycopg2) when every column is a plain type.
+
+        The target tables are expected to be empty.
+    """
+    _COPY_TYPES = (int, float, Decimal, bool, str, datetime, date, time)
+
+    def __init__(self, models, backup_path, batch_size=5000, workers=1, use_copy=True):
+        self.models = models
+        self.backup_path = backup_path
+        self.batch_size = batch_size
+        self.workers = workers
+        self.use_copy = use_copy
+
+        self._run()
+
+    def _get_tables(self):
+        return ModelRegistry.get_models(models=self.models)
+
+    def _get_files(self):
+        """
+            Return {table_name: (file_pathname, format_class)} of the readable files.
+        """
+        files = dict()
+        for name in BackupFormats.names():
+            format_class = BackupFormats.get(name)
+            if not hasattr(format_class, 'read_rows'):
+                continue
+            for file_name in sorted(os.listdir(self.backup_path)):
+                if not file_name.endswith(format_class.extension):
+                    continue
+                table_name = file_name[:-len(format_class.extension)]
+                if '.' in table_name:
+                    continue
+                files[table_name] = (os.path.join(self.backup_path, file_name), format_class)
+        return files
+
+    def _get_model(self, tables, table_name):
+        table = tables.get(Utils.underscore_to_camel(letters=table_name))
+        if table is not None:
+            return table
+        return ModelRegistry.get_by_file_name(models=self.models, file_name=table_name)
+
+    @staticmethod
+    def _parse_bool(value):
+        return value == 'True'
+
+    @staticmethod
+    def _parse_timedelta(value):
+        """
+            str(timedelta) -> '1 day, 2:03:04.000005' or '-1 days, 23:59:59'
+        """
+        days = 0
+        if ',' in value:
+            days_part, value = value.split(', ')
+            days = int(days_part.split(' ')[0])
+        hours, minutes, seconds = value.split(':')
+        return timedelta(days=days, hours=int(hours), minutes=int(minutes), seconds=float(seconds))
+
+    @classmethod
+    def _get_parser(cls, column_type, python_type):
+        """
+            Return a function turning the CSV text of a column back into its python value.
+        """
+        if python_type is None:
+            return None
+        parsers = {
+            str: None,
+            int: int,
+            float: float,
+            Decimal: Decimal,
+            bool: cls._parse_bool,
+            datetime: datetime.fromisoformat,
+            date: date.fromisoformat,
+            time: time.fromisoformat,
+            timedelta: cls._parse_timedelta,
+            uuid.UUID: uuid.UUID,
+            bytes: ast.literal_eval,
+            dict: ast.literal_eval,
+            list: ast.literal_eval,
+        }
+        if python_type in parsers:
+            return parsers[python_type]
+        enum_class = getattr(column_type, 'enum_class', None)
+        if enum_class is not None:
+            return lambda value: enum_class[value.rsplit('.', 1)[-1]]
+        return None
+
+    @classmethod
+    def _iter_batches(cls, rows, fieldnames, parsers, column_keys, batch_size):
+        indexes = [(index, column_keys[name], parsers[name]) for index, name in enumerate(fieldnames)]
+        batch = list()
+        for row in rows:
+            record = dict()
+            for index, key, parser in indexes:
+                value = row[index]
+                if value == 'NULL':
+                    record[key] = None
+                elif parser is None:
+                    record[key] = value
+                else:
+                    record[key] = parser(value)
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = list()
+        if batch:
+            yield batch
+
+    def _can_copy(self, engine, format_class, python_types):
+        if not self.use_copy or engine.dialect.name != 'postgresql' or format_class.name != 'csv':
+            return False
+        if engine.dialect.driver != 'psycopg2':
+            return False
+        return all(python_type in self._COPY_TYPES for python_type in python_types.values())
+
+    @staticmethod
+    def _copy(connection, table, file_pathname, column_names):
+        """
+            COPY the file as is, quoted 'NULL' is turned into NULL by FORCE_NULL.
+        """
+        preparer = connection.dialect.identifier_preparer
+        columns = ', '.join(preparer.quote(name) for name in column_names)
+        sql = (
+            f'COPY {preparer.format_table(table)} ({columns}) FROM STDIN '
+            f"WITH (FORMAT csv, HEADER true, DELIMITER ',', QUOTE '|', NULL 'NULL', FORCE_NULL ({columns}))")
+        cursor = connection.connection.cursor()
+        with open(file_pathname, 'r', encoding='utf-8', newline='') as fr:
+            cursor.copy_expert(sql, fr)
+        return cursor.rowcount
+
+    @staticmethod
+    def _reset_sequence(connection, table):
+        """
+            Move the serial sequence of the primary key past the restored ids, PostgreSQL only.
+        """
+        if connection.dialect.name != 'postgresql' or len(table.primary_key.columns) != 1:
+            return
+        column = list(table.primary_key.columns)[0]
+        if not column.autoincrement or getattr(column.type, 'python_type', None) is not int:
+            return
+        connection.execute(
+            text(f'SELECT setval(pg_get_serial_sequence(:table, :column), '
+                f'COALESCE(MAX({connection.dialect.identifier_preparer.quote(column.name)}), 1)) '
+                f'FROM {connection.dialect.identifier_preparer.format_table(table)}'),
+            {'table': table.fullname, 'column': column.name})
+
+    def _restore_table(self, table, engine, file_pathname, format_class):
+        """
+            Worker: load one file in a single transaction, return the row count.
+        """
+        meta = ModelRegistry.get(model=table)
+        sql_table = table.__table__
+        rows = format_class.read_rows(pathname=file_pathname)
+        fieldnames = next(rows, None)
+        if fieldnames is None:
+            return 0
+        count = 0
+        with engine.begin() as connection:
+            if self._can_copy(engine=engine, format_class=format_class, python_types=meta.python_types):
+                rows.close()
+                column_names = [meta.column_names[name] for name in fieldnames]
+                count = self._copy(
+                    connection=connection, table=sql_table, file_pathname=file_pathname, column_names=column_names)
+            else:
+                parsers = {
+                    name: self._get_parser(column_type=meta.column_types[name], python_type=meta.python_types[name])
+                    for name in fieldnames
+                }
+                insert = sql_table.insert()
+                batches = self._iter_batches(
+                    rows=rows, fieldnames=fieldnames, parsers=parsers, column_keys=meta.column_keys,
+                    batch_size=self.batch_size)
+                for batch in batches:
+                    connection.execute(insert, batch)
+                    count += len(batch)
+            self._reset_sequence(connection=connection, table=sql_table)
+        return count
+
+    @staticmethod
+    def _get_levels(tasks):
+        """
+            Group tables by foreign key depth, a table only depends on lower levels.
+        """
+        sql_tables = {task['table'].__table__: task for task in tasks}
+        depths = dict()
+        for sql_table in sql_tables:
+            stack = [(sql_table, False)]
+            while stack:
+                current, expanded = stack.pop()
+                if current in depths:
+                    continue
+                parents = {
+                    key.column.table for key in current.foreign_keys
+                    if key.column.table is not current and key.column.table in sql_tables
+                }
+                pending = [parent for parent in parents if parent not in depths]
+                if expanded or not pending:
+                    depths[current] = 1 + max((depths.get(parent, 0) for parent in parents), default=0)
+                    continue
+                stack.append((current, True))
+                stack.extend((parent, False) for parent in pending)
+        levels = dict()
+        for sql_table, task in sql_tables.items():
+            levels.setdefault(depths[sql_table], list()).append(task)
+        return [levels[depth] for depth in sorted(levels)]
+
+    def _run(self):
+        tables = self._get_tables()
+        tasks = list()
+        for table_name, (file_pathname, format_class) in self._get_files().items():
+            table = self._get_model(tables=tables, table_name=table_name)
+            if table is None:
+                print(f'[{"WARNING":10}]| No model for {file_pathname}')
+                continue
+            tasks.append({
+                'table_name': table_name,
+                'table': table,
+                'engine': table.query.session.get_bind(mapper=sa_inspect(table)),
+                'file_pathname': file_pathname,
+                'format_class': format_class,
+            })
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for level in self._get_levels(tasks=tasks):
+                futures = [
+                    (task, executor.submit(
+                        self._restore_table, table=task['table'], engine=task['engine'],
+                        file_pathname=task['file_pathname'], format_class=task['format_class']))
+                    for task in level
+                ]
+                for task, future in futures:
+                    count = future.result()
+                    print(f'[<< RESTORE]| {task["table_name"][:20]:21}| {count:,} Qty.', flush=True)
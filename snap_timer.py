@@ -1,9 +1,26 @@
 import os
 import time
+import random
+import threading
 from datetime import datetime, timedelta
+from scraping_tools.timing_stats import TimingRegistry
 
 
 class SnapTimer:
+    """
+        SnapTimer(snap_interval, start=None, name=None, **kwargs)
+
+        Print the summary of a run and sleep `snap_interval` seconds.
+        The run duration is measured from `TimingRegistry.mark()` (set by DecoratorUtils.snap_interval
+        and SnapScheduler) on the monotonic clock, or from `start` (time.time()) otherwise,
+        and recorded into the histogram `name` ('snap_timer' when None) with the stages of the run.
+
+        How to use:
+            TimingRegistry.mark()
+            with TimingRegistry.stage('fetch'):
+                ...
+            SnapTimer(snap_interval=60, name='my_scraper')
+    """
 
     try:
         terminal_size = os.get_terminal_size(0)[0]
@@ -40,20 +57,44 @@ class SnapTimer:
             return f'{round(seconds / 60, 2)} minutes.'
         return f'{round(seconds, 2)} seconds.'
 
-    def _sleep(self):
-        fmt_interval = self._fmt_interval(self.snap_interval)
-        timedelta_ = timedelta(seconds=self.snap_interval)
+    def _print_sleep(self, seconds):
+        fmt_interval = self._fmt_interval(seconds)
+        timedelta_ = timedelta(seconds=seconds)
         next_round = self._fmt_datetime(timedelta_=timedelta_)
         if self.name is not None:
             print(f'[{self._fmt_datetime()}] [{"INFO":8}] [ * FINISH ✅ : {self.name}]')
         print(f'[{self._fmt_datetime()}] [{"INFO":8}] [ * SLEEP : {fmt_interval}]')
         print(f'[{self._fmt_datetime()}] [{"INFO":8}] [ * NEXT ROUND : {next_round}]')
         self._print_divider()
-        time.sleep(self.snap_interval)
+
+    def _wait(self, seconds):
+        """
+            Block for `seconds`, return True when woken up early.
+        """
+        time.sleep(seconds)
+        return False
+
+    def _sleep(self, seconds=None):
+        seconds = self.snap_interval if seconds is None else seconds
+        self._print_sleep(seconds)
+        return self._wait(seconds)
 
     def _consume(self):
-        if self.start is not None:
-            print(f'[{self._fmt_datetime()}] [{"CONSUME":8}] [ * {round(time.time() - self.start, 2)} sec.]')
+        seconds, stages = TimingRegistry.pop_run()
+        if seconds is None and self.start is not None:
+            seconds = time.time() - self.start
+        if seconds is None:
+            return None
+        histogram = TimingRegistry.get(self.name or 'snap_timer')
+        histogram.add(seconds)
+        print(f'[{self._fmt_datetime()}] [{"CONSUME":8}] [ * {round(seconds, 2)} sec.]')
+        for stage, stage_seconds in stages.items():
+            print(f'[{self._fmt_datetime()}] [{"STAGE":8}] [ * {stage} : {round(stage_seconds, 2)} sec.]')
+        summary = histogram.get_summary()
+        if summary['count'] > 1:
+            print(f'[{self._fmt_datetime()}] [{"STATS":8}] [ * p50 {round(summary["p50"], 2)} / '
+                f'p95 {round(summary["p95"], 2)} / p99 {round(summary["p99"], 2)} / '
+                f'max {round(summary["max"], 2)} sec. of {summary["count"]} runs]')
         return None
 
     def _extra_info(self):
@@ -68,3 +109,103 @@ class SnapTimer:
         self._extra_info()
         self._consume()
         self._sleep()
+
+
+class SnapScheduler(SnapTimer):
+    """
+        SnapScheduler(snap_interval, name=None, overrun='skip', jitter=0, stop_event=None, stop_signals=(), **kwargs)
+
+        Run a job on a fixed cadence, deadlines are kept on the monotonic clock so the period
+        does not grow with the work time, and print the same summary as SnapTimer after each run.
+        以固定節奏執行, 不因工作耗時而漂移.
+
+        :overrun: when a run takes longer than the interval,
+            'skip': drop the missed ticks and wait for the next one on the grid.
+            'coalesce': run once right away for all the missed ticks, the cadence restarts from that run.
+        :jitter: add up to `jitter` random seconds to each wait, spreading many instances, the grid itself does not move.
+        :stop_event: threading.Event, setting it wakes the wait up and stops the loop.
+        :stop_signals: e.g. (signal.SIGTERM, signal.SIGINT), stop after the current run, main thread only.
+
+        How to use:
+            scheduler = SnapScheduler(snap_interval=60, name='my_scraper', jitter=5, stop_signals=(signal.SIGTERM,))
+            scheduler.run(job, *args, **kwargs)
+            scheduler.stop()    -> from another thread
+    """
+    OVERRUNS = ('skip', 'coalesce')
+
+    def __init__(self, snap_interval, name=None, overrun='skip', jitter=0, stop_event=None, stop_signals=(), **kwargs):
+        if overrun not in self.OVERRUNS:
+            raise Exception(f'[{"ERROR":10}]| Invalid overrun policy: {overrun}, choose from {self.OVERRUNS}')
+        self.snap_interval = snap_interval
+        self.start = None
+        self.extra_info_dict = kwargs
+        self.name = name
+        self.overrun = overrun
+        self.jitter = jitter
+        self.stop_event = stop_event or threading.Event()
+        self.stop_signals = stop_signals
+
+        self.runs = 0
+        self.missed = 0
+        self._random = random.Random()
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+    def _wait(self, seconds):
+        return self.stop_event.wait(seconds)
+
+    def _install_signals(self):
+        if not self.stop_signals or threading.current_thread() is not threading.main_thread():
+            return dict()
+        import signal
+        return {signum: signal.signal(signum, self.stop) for signum in self.stop_signals}
+
+    @staticmethod
+    def _restore_signals(previous):
+        if not previous:
+            return
+        import signal
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
+    def _get_next_deadline(self, deadline, now):
+        """
+            Move `deadline` one interval forward, handle the ticks missed while running.
+        """
+        deadline += self.snap_interval
+        if now <= deadline:
+            return deadline
+        missed = int((now - deadline) // self.snap_interval) + 1
+        self.missed += missed
+        if self.overrun == 'coalesce':
+            return now
+        return deadline + missed * self.snap_interval
+
+    def run(self, job, *args, max_runs=None, **kwargs):
+        """
+            Call `job(*args, **kwargs)` on every tick until stopped or `max_runs` runs.
+        """
+        previous = self._install_signals()
+        try:
+            deadline = time.monotonic()
+            while not self.stop_event.is_set():
+                self.start = time.time()
+                TimingRegistry.mark()
+                job(*args, **kwargs)
+                self.runs += 1
+                self._print_divider()
+                self._extra_info()
+                self._consume()
+                if max_runs is not None and self.runs >= max_runs:
+                    break
+                now = time.monotonic()
+                deadline = self._get_next_deadline(deadline=deadline, now=now)
+                delay = deadline - now
+                if self.jitter:
+                    delay += self._random.uniform(0, self.jitter)
+                if self._sleep(seconds=delay):
+                    break
+        finally:
+            self._restore_signals(previous=previous)
+        return self.runs
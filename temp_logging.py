@@ -1,30 +1,124 @@
 import os
+import atexit
+import threading
 from datetime import datetime
 
 
 class TempLogging:
+    """
+        TempLogging(name='temp', path='log/temp_log', buffer_size=65536, flush_interval=1.0, max_bytes=0)
 
-    def __init__(self, name='temp', path='log/temp_log'):
+        Append lines to `<path>/<name>_%Y-%m-%dT%H:%M.txt` through one buffered handle,
+        flushed every `flush_interval` seconds, on `flush`, `close` and at exit.
+        保持檔案開啟並緩衝寫入, 可在多執行緒中使用.
+
+        :buffer_size: bytes buffered before a write reaches the file.
+        :flush_interval: seconds between background flushes, None to flush only on `flush`/`close`/exit.
+        :max_bytes: roll the file over to `<file name>.1.txt`, `.2.txt`, ... once it would exceed this size, 0 never.
+
+        How to use:
+            with TempLogging(name='urls') as temp_logging:
+                temp_logging.add(url)
+    """
+
+    def __init__(self, name='temp', path='log/temp_log', buffer_size=65536, flush_interval=1.0, max_bytes=0):
         self.path = path
         self.filename = f'{name}_{datetime.now().strftime("%Y-%m-%dT%H:%M")}.txt'
         self.pathname = os.path.join(self.path, self.filename)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._dirty = False
+        self._rollovers = 0
+        self._closed = threading.Event()
+        self._flusher = None
+
         self._make_dirs()
         self._create_file()
 
-    def _get_now(self, format_='%Y-%m-%dT%H:%M:%S,%f', datetime_=datetime.now()):
+    def _get_now(self, format_='%Y-%m-%dT%H:%M:%S,%f', datetime_=None):
+        datetime_ = datetime_ or datetime.now()
         return datetime_.strftime(format_)
 
     def _make_dirs(self):
         os.makedirs(self.path, exist_ok=True)
 
+    def _open(self, mode='ab'):
+        self._file = open(self.pathname, mode, buffering=self.buffer_size)
+        self._size = self._file.tell()
+        # flush at exit while the handle is open, unregistered by `close` so closed instances can be collected
+        atexit.unregister(self.close)
+        atexit.register(self.close)
+
     def _create_file(self):
-        with open(self.pathname, 'w') as fw:
-            print(f'[{self._get_now()[:-3]}] [{"INFO":8}] [ * Start logging {self.filename}!]')
+        self._open(mode='wb')
+        print(f'[{self._get_now()[:-3]}] [{"INFO":8}] [ * Start logging {self.filename}!]')
+
+    def _start_flusher(self):
+        if self.flush_interval is None or self._flusher is not None:
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name='temp_logging_flush', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def _get_rollover_pathname(self):
+        root, extension = os.path.splitext(self.pathname)
+        while True:
+            self._rollovers += 1
+            pathname = f'{root}.{self._rollovers}{extension}'
+            if not os.path.exists(pathname):
+                return pathname
+
+    def _rollover(self):
+        self._file.close()
+        os.replace(self.pathname, self._get_rollover_pathname())
+        self._open(mode='wb')
 
     def add(self, log, display=False):
         if display:
             print(f'[{self._get_now()[:-3]}] [{"INFO":8}] [ * {log[:40]}]')
-        with open(self.pathname, 'a') as fw:
-            fw.write(f'{log}\n')
+        line = f'{log}\n'.encode()
+        with self._lock:
+            if self._file is None:
+                self._open()
+            if self.max_bytes and self._size and self._size + len(line) > self.max_bytes:
+                self._rollover()
+            self._file.write(line)
+            self._size += len(line)
+            self._dirty = True
+            self._start_flusher()
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None and self._dirty:
+                self._file.flush()
+                self._dirty = False
+
+    def close(self):
+        """
+            Flush and release the handle, a later `add` opens it again.
+        """
+        atexit.unregister(self.close)
+        self._closed.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        self._flusher = None
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._dirty = False
+        self._closed.clear()
 
+    def __enter__(self):
+        return self
 
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
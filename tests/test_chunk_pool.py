@@ -0,0 +1,92 @@
+"""
+    python -m unittest scraping_tools.tests.test_chunk_pool
+"""
+# built-in
+import os, time, unittest
+# submodule
+from scraping_tools.chunk_pool import ChunkPool
+
+
+def _double(chunk):
+    return [value * 2 for value in chunk]
+
+
+def _late_first(chunk):
+    """
+        The first chunk finishes last, the others right away.
+    """
+    if chunk[0] == 0:
+        time.sleep(0.3)
+    return chunk[0]
+
+
+def _fail_first(chunk):
+    if chunk[0] == 0:
+        raise ValueError('chunk 0')
+    time.sleep(0.05)
+    return chunk[0]
+
+
+def _get_shared_memory_blocks():
+    return {name for name in os.listdir('/dev/shm') if name.startswith('psm_')}
+
+
+class ChunkPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.consumed = 0
+
+    def _get_chunks(self, quantity, size=4):
+        for index in range(quantity):
+            self.consumed += 1
+            yield [index] * size
+
+    def test_ordered(self):
+        with ChunkPool(transform=_late_first, workers=2, ordered=True) as pool:
+            self.assertEqual(list(pool.map(self._get_chunks(quantity=10))), list(range(10)))
+
+    def test_unordered(self):
+        with ChunkPool(transform=_late_first, workers=2, ordered=False) as pool:
+            results = list(pool.map(self._get_chunks(quantity=10)))
+        self.assertEqual(sorted(results), list(range(10)))
+        self.assertNotEqual(results[0], 0)
+
+    def test_shared_memory(self):
+        with ChunkPool(transform=_double, workers=2, shared_memory_bytes=1) as pool:
+            results = list(pool.map([list(range(index, index + 100)) for index in range(5)]))
+        self.assertEqual(results, [[value * 2 for value in range(index, index + 100)] for index in range(5)])
+
+    def test_backpressure(self):
+        for ordered in (True, False):
+            self.consumed = 0
+            with ChunkPool(transform=_late_first, workers=2, max_in_flight=3, ordered=ordered) as pool:
+                for yielded, _ in enumerate(pool.map(self._get_chunks(quantity=20)), start=1):
+                    # the chunk read last waits for a free slot
+                    self.assertLessEqual(self.consumed - yielded, 3)
+            self.assertEqual(self.consumed, 20)
+
+    def test_worker_exception(self):
+        for ordered in (True, False):
+            self.consumed = 0
+            with ChunkPool(transform=_fail_first, workers=2, max_in_flight=4, ordered=ordered) as pool:
+                with self.assertRaises(ValueError):
+                    list(pool.map(self._get_chunks(quantity=100)))
+            self.assertLessEqual(self.consumed, 5 + 4)
+
+    @unittest.skipUnless(os.path.isdir('/dev/shm'), 'POSIX shared memory is listed in /dev/shm')
+    def test_shared_memory_released_on_break(self):
+        for ordered in (True, False):
+            before = _get_shared_memory_blocks()
+            with ChunkPool(transform=_late_first, workers=2, max_in_flight=4, ordered=ordered,
+                    shared_memory_bytes=1) as pool:
+                results = pool.map(self._get_chunks(quantity=20))
+                for _ in results:
+                    # let the other chunks of the window finish meanwhile
+                    time.sleep(0.3)
+                    break
+                results.close()
+                self.assertEqual(_get_shared_memory_blocks() - before, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+# built-in
+import math, json, time, threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class TimingHistogram:
+    """
+        TimingHistogram(name, window=1000)
+
+        Durations in seconds of the last `window` observations, count and sum cover every observation.
+        保留最近 `window` 筆耗時, 計算 p50/p95/p99.
+    """
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, name, window=1000):
+        self.name = name
+        self.window = window
+        self._lock = threading.Lock()
+        self._values = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        with self._lock:
+            self._values.append(seconds)
+            self.count += 1
+            self.sum += seconds
+            self.min = seconds if self.min is None else min(self.min, seconds)
+            self.max = seconds if self.max is None else max(self.max, seconds)
+
+    @staticmethod
+    def _get_percentile(values, quantile):
+        """
+            Nearest rank of sorted `values`.
+        """
+        if not values:
+            return None
+        index = max(math.ceil(quantile * len(values)) - 1, 0)
+        return values[index]
+
+    def get_summary(self):
+        """
+            return {
+                'count': 42, 'sum': 12.3, 'min': 0.1, 'max': 0.9, 'mean': 0.29,
+                'p50': 0.25, 'p95': 0.8, 'p99': 0.9,
+            }
+            min and max cover every observation, the percentiles only the window.
+        """
+        with self._lock:
+            values = sorted(self._values)
+            summary = {
+                'count': self.count,
+                'sum': self.sum,
+                'min': self.min,
+                'max': self.max,
+                'mean': self.sum / self.count if self.count else None,
+            }
+        for quantile in self.QUANTILES:
+            summary[f'p{round(quantile * 100)}'] = self._get_percentile(values=values, quantile=quantile)
+        return summary
+
+
+class TimingRegistry:
+    """
+        Named TimingHistograms shared by SnapTimer, its decorator and the stage timers.
+        耗時統計集中管理, 可匯出 JSON 或 Prometheus 格式.
+
+        How to use:
+            with TimingRegistry.stage('fetch'):
+                ...
+            @TimingRegistry.stage('parse')
+            def parse(...):
+                ...
+            TimingRegistry.observe('persist', seconds)
+            TimingRegistry.to_json()        -> '{"fetch": {"count": 1, "p50": 0.12, ...}, ...}'
+            TimingRegistry.to_prometheus()  -> text exposition format
+    """
+    window = 1000
+    _lock = threading.RLock()
+    _histograms = dict()
+    # (monotonic start, {stage: seconds}) of the current run, per thread and per asyncio task
+    _run = ContextVar('timing_run', default=None)
+
+    @classmethod
+    def get(cls, name):
+        histogram = cls._histograms.get(name)
+        if histogram is not None:
+            return histogram
+        with cls._lock:
+            histogram = cls._histograms.get(name)
+            if histogram is None:
+                histogram = TimingHistogram(name=name, window=cls.window)
+                cls._histograms[name] = histogram
+        return histogram
+
+    @classmethod
+    def observe(cls, name, seconds):
+        cls.get(name).add(seconds)
+        run = cls._run.get()
+        if run is not None:
+            run[1][name] = run[1].get(name, 0) + seconds
+
+    @classmethod
+    @contextmanager
+    def stage(cls, name):
+        """
+            Time the block with the monotonic clock into the histogram `name`.
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            cls.observe(name, time.monotonic() - start)
+
+    @classmethod
+    def mark(cls):
+        """
+            Start a run on this thread or asyncio task,
+            `pop_run` returns its duration and the stages observed since.
+        """
+        cls._run.set((time.monotonic(), dict()))
+
+    @classmethod
+    def pop_run(cls):
+        """
+            return (seconds, {stage: seconds}) of the run started by `mark`, (None, {}) without one.
+        """
+        run = cls._run.get()
+        if run is None:
+            return None, dict()
+        cls._run.set(None)
+        return time.monotonic() - run[0], run[1]
+
+    @classmethod
+    def to_dict(cls):
+        with cls._lock:
+            histograms = list(cls._histograms.values())
+        return {histogram.name: histogram.get_summary() for histogram in histograms}
+
+    @classmethod
+    def to_json(cls, **kwargs):
+        return json.dumps(cls.to_dict(), **kwargs)
+
+    @staticmethod
+    def _escape_label(value):
+        return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+    @classmethod
+    def to_prometheus(cls, metric='scraping_tools_timing_seconds'):
+        """
+            One summary with a `name` label per histogram, plus min and max gauges.
+        """
+        lines = [f'# HELP {metric} Durations of runs and stages in seconds.', f'# TYPE {metric} summary']
+        minimums = list()
+        maximums = list()
+        for name, summary in sorted(cls.to_dict().items()):
+            label = f'name="{cls._escape_label(name)}"'
+            for quantile in TimingHistogram.QUANTILES:
+                value = summary[f'p{round(quantile * 100)}']
+                if value is not None:
+                    lines.append(f'{metric}{{{label},quantile="{quantile}"}} {value}')
+            lines.append(f'{metric}_sum{{{label}}} {summary["sum"]}')
+            lines.append(f'{metric}_count{{{label}}} {summary["count"]}')
+            if summary['count']:
+                minimums.append(f'{metric}_min{{{label}}} {summary["min"]}')
+                maximums.append(f'{metric}_max{{{label}}} {summary["max"]}')
+        if minimums:
+            lines.append(f'# TYPE {metric}_min gauge')
+            lines.extend(minimums)
+            lines.append(f'# TYPE {metric}_max gauge')
+            lines.extend(maximums)
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    def reset(cls, name=None):
+        """
+            Drop the histogram `name`, or all of them when None.
+        """
+        with cls._lock:
+            if name is None:
+                cls._histograms.clear()
+                return
+            cls._histograms.pop(name, None)
@@ -1,5 +1,7 @@
-from functools import wraps
+import re
+from functools import lru_cache, wraps
 from datetime import timedelta
+from scraping_tools.timing_stats import TimingRegistry
 
 class DecoratorUtils:
     def snap_interval(**kwargs):
@@ -11,14 +13,37 @@ class DecoratorUtils:
                 snap_interval = 60 * 60 * 24 * 7
             @wraps(method)
             def wrapper(*args, **kwargs):
+                # SnapTimer measures the run from here on the monotonic clock
+                TimingRegistry.mark()
                 return method(*args, **kwargs, snap_interval=snap_interval)
             return wrapper
         return decorator
 
+    def async_snap_interval(**kwargs):
+        """
+            snap_interval for coroutine functions, use with AsyncSnapTimer.
+        """
+        def decorator(method):
+            seconds = timedelta(**kwargs).total_seconds()
+            if isinstance(seconds, float) or isinstance(seconds, int):
+                snap_interval = seconds
+            else:
+                snap_interval = 60 * 60 * 24 * 7
+            @wraps(method)
+            async def wrapper(*args, **kwargs):
+                # the run is marked in the context of the awaiting task
+                TimingRegistry.mark()
+                return await method(*args, **kwargs, snap_interval=snap_interval)
+            return wrapper
+        return decorator
+
 
 class Utils:
+    # lower or digit followed by upper, or the last upper of an acronym followed by upper and lower
+    _CAMEL_BOUNDARY = re.compile(r'(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])')
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def underscore_to_camel(letters, delimiter='_'):
         """
         Allow one or more letters convert into camel style.
@@ -30,13 +55,56 @@ class Utils:
         return letters.title().replace(delimiter, '')
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def camel_to_underscore(letters, delimiter='_'):
         """
         Allow one or more letters convert into underscore style.
-        單、複數詞組由駝峰轉換底線
-        'MyModelName' -> '_my_model_name' -> 'my_model_name'
+        單、複數詞組由駝峰轉換底線, 縮寫與數字視為同一詞
+        'MyModelName' -> 'my_model_name'
+        'HTTPResponse' -> 'http_response'
+        'OAuth2Token' -> 'o_auth2_token'
+        """
+        if letters.islower():
+            return letters
+        return Utils._CAMEL_BOUNDARY.sub(delimiter, letters).lower().lstrip(delimiter)
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def camel_to_file_name(letters, delimiter='_'):
+        """
+        Previous conversion, every capital starts a word, used for backup file names
+        so acronym models keep the names recorded in existing backups and manifests.
+        備份檔名沿用舊版轉換, 每個大寫字母皆分詞
+        'MyModelName' -> 'my_model_name'
+        'HTTPLog' -> 'h_t_t_p_log'
         """
         if letters.islower():
             return letters
         result = ''.join([f'{delimiter}{_.lower()}' if _.isupper() else _ for _ in letters])
         return result.lstrip(delimiter)
+
+    @staticmethod
+    def convert_keys(rows, converter):
+        """
+        Convert the keys of every dict of `rows` with `converter`, in one pass.
+        Rows sharing the same keys (rows of one table) reuse the converted keys.
+        [{'myKey': 1}, {'myKey': 2}] -> [{'my_key': 1}, {'my_key': 2}]
+        """
+        result = list()
+        last_keys = None
+        new_keys = None
+        for row in rows:
+            keys = tuple(row)
+            if keys != last_keys:
+                last_keys = keys
+                new_keys = [converter(key) for key in keys]
+            result.append(dict(zip(new_keys, row.values())))
+        return result
+
+    @classmethod
+    def keys_to_underscore(cls, rows, delimiter='_'):
+        return cls.convert_keys(rows=rows, converter=lambda key: cls.camel_to_underscore(key, delimiter))
+
+    @classmethod
+    def keys_to_camel(cls, rows, delimiter='_'):
+        return cls.convert_keys(rows=rows, converter=lambda key: cls.underscore_to_camel(key, delimiter))